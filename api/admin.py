@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Item, ItemQuery
+from .models import Bid, Item, ItemQuery, Outbox
 
 admin.site.register(Item)
 admin.site.register(ItemQuery)
+admin.site.register(Bid)
+admin.site.register(Outbox)
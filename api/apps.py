@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
 
 
 class ApiConfig(AppConfig):
@@ -6,3 +8,19 @@ class ApiConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "api"
+
+    def ready(self):
+        from project.database import apply_sqlite_pragmas
+        from userauth.models import User
+
+        from .models import Item, ItemQuery
+        from .search import ensure_search_index
+        from .serialization import invalidate_instance
+
+        connection_created.connect(apply_sqlite_pragmas)
+        post_migrate.connect(ensure_search_index, sender=self)
+
+        # keep the serialization cache in sync, bulk updates invalidate it themselves
+        for model in (Item, ItemQuery, User):
+            post_save.connect(invalidate_instance, sender=model)
+            post_delete.connect(invalidate_instance, sender=model)
@@ -0,0 +1,153 @@
+import asyncio
+from typing import Any, Dict, Iterator, List, Tuple
+from urllib.parse import urlsplit
+
+from django.core.handlers.exception import response_for_exception
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.urls import Resolver404, resolve
+
+from project.middleware import json_to_query_dict
+
+from .encoders import encode
+
+# most sub-requests accepted in one batch
+MAX_BATCH_REQUESTS = 20
+
+METHODS = ("GET", "POST", "PUT", "DELETE")
+
+# headers of the batch request that don't apply to its sub-requests, whose
+# views would otherwise compare them to their own ETags
+CONDITIONAL_HEADERS = (
+    "HTTP_IF_MATCH",
+    "HTTP_IF_NONE_MATCH",
+    "HTTP_IF_MODIFIED_SINCE",
+    "HTTP_IF_UNMODIFIED_SINCE",
+)
+
+
+class InvalidBatchRequest(ValueError):
+    """Raised when a batch or one of its sub-requests is malformed"""
+
+
+def parse_batch(params: Any) -> List[Dict[str, Any]]:
+    """Validate the decoded body of a batch request, and return its sub-requests"""
+    if not isinstance(params, dict) or not isinstance(params.get("requests"), list):
+        raise InvalidBatchRequest("Body must be an object with a list of requests")
+
+    requests = params["requests"]
+    if len(requests) > MAX_BATCH_REQUESTS:
+        raise InvalidBatchRequest(
+            f"A batch cannot hold more than {MAX_BATCH_REQUESTS} requests"
+        )
+
+    for sub in requests:
+        if not isinstance(sub, dict) or not isinstance(sub.get("path"), str):
+            raise InvalidBatchRequest("Every request must have a path")
+        if sub.setdefault("method", "GET") not in METHODS:
+            raise InvalidBatchRequest(f"Method must be one of {', '.join(METHODS)}")
+        if not isinstance(sub.setdefault("body", {}), dict):
+            raise InvalidBatchRequest("Request bodies must be objects")
+    return requests
+
+
+def split_path(path: str) -> Tuple[str, str]:
+    """Split the path of a sub-request into its path relative to api.urls, with
+    a trailing slash, and its query string. The /api prefix is optional"""
+    url = urlsplit(path)
+    path = "/" + url.path.strip("/")
+    if path == "/api" or path.startswith("/api/"):
+        path = path[len("/api") :]
+    return path.rstrip("/") + "/", url.query
+
+
+def build_request(
+    request: HttpRequest, method: str, path: str, query: str, body: Dict[str, Any]
+) -> HttpRequest:
+    """Build a sub-request, sharing the session and user of the batch request"""
+    sub_request = HttpRequest()
+    sub_request.method = method
+    sub_request.path = sub_request.path_info = f"/api{path}"
+    sub_request.META = {
+        **{
+            name: value
+            for name, value in request.META.items()
+            if name not in CONDITIONAL_HEADERS
+        },
+        "REQUEST_METHOD": method,
+        "PATH_INFO": sub_request.path,
+        "QUERY_STRING": query,
+    }
+    sub_request.GET = QueryDict(query)
+    sub_request.COOKIES = request.COOKIES
+    sub_request.session = request.session
+    sub_request.user = request.user
+
+    # like rest_middleware does for JSON bodies
+    data = json_to_query_dict(body)
+    sub_request.POST = data if method == "POST" else QueryDict()
+    sub_request.PUT = data if method == "PUT" else QueryDict()
+    sub_request.DELETE = data if method == "DELETE" else QueryDict()
+    return sub_request
+
+
+def dispatch(request: HttpRequest, sub: Dict[str, Any]) -> HttpResponse:
+    """Run the api view of a sub-request, and return its response.
+
+    Exceptions are turned into responses like Django does for normal requests.
+    """
+    path, query = split_path(sub["path"])
+    try:
+        match = resolve(path, urlconf="api.urls")
+    except Resolver404:
+        return error_response("Not found", 404)
+
+    # batches can't nest, and async views stream their responses
+    if match.url_name == "batch" or asyncio.iscoroutinefunction(match.func):
+        return error_response("This endpoint cannot be batched", 400)
+
+    sub_request = build_request(request, sub["method"], path, query, sub["body"])
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+    except Exception as e:
+        response = response_for_exception(sub_request, e)
+
+    if response.streaming:
+        return error_response("Streamed responses cannot be batched", 400)
+    return response
+
+
+def error_response(message: str, status: int) -> HttpResponse:
+    """Return an API error response for a sub-request"""
+    return HttpResponse(
+        encode({"status": "FAILED", "message": message}),
+        content_type="application/json",
+        status=status,
+    )
+
+
+def encode_results(responses: List[HttpResponse]) -> Iterator[bytes]:
+    """Encode the responses of the sub-requests as one API response.
+
+    JSON responses are copied in as they are instead of being decoded and
+    encoded again. Other responses, such as error pages, are replaced by an
+    API error with their reason phrase.
+    """
+    yield b'{"status":"OK","value":['
+    for i, response in enumerate(responses):
+        if response.get("Content-Type", "").startswith("application/json"):
+            body = response.content
+        else:
+            body = encode({"status": "FAILED", "message": response.reason_phrase})
+        separator = b"," if i else b""
+        yield separator + b'{"status":' + encode(response.status_code)
+        yield b',"body":' + body + b"}"
+    yield b"]}"
+
+
+def run_batch(request: HttpRequest, params: Any) -> HttpResponse:
+    """Run every sub-request of a batch in order, and return all their responses"""
+    requests = parse_batch(params)
+    responses = [dispatch(request, sub) for sub in requests]
+    return HttpResponse(
+        b"".join(encode_results(responses)), content_type="application/json"
+    )
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from django.db import connections
+
+
+@contextmanager
+def benchmark_database(verbosity: int = 0):
+    """Run the body against a freshly migrated, throwaway copy of the default database.
+
+    Works like the test runner's database setup, except that SQLite databases are
+    created as a file instead of in memory so that several threads can share them.
+    """
+    connection = connections["default"]
+    tmp_dir = None
+    if connection.vendor == "sqlite":
+        tmp_dir = tempfile.mkdtemp(prefix="bench-")
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(
+            tmp_dir, "bench.sqlite3"
+        )
+
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Return the p-th percentile (0-100) of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Summarize latencies in seconds as p50/p95/p99 milliseconds"""
+    return {
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+class Stopwatch:
+    """Context manager measuring the wall-clock time of its body"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from project.metrics import Counter
+from userauth.models import User
+
+from .models import Bid, Item
+from .serialization import invalidate
+
+bids_placed = Counter("auction_bids_placed_total", "Bids accepted on items")
+
+
+class BidRejected(Exception):
+    """Raised when a bid can't be placed on an item"""
+
+    def __init__(self, message: str, status: int, field_error: bool = False):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        # whether the bid price itself was rejected, as opposed to the item
+        self.field_error = field_error
+
+
+def place_bid(item_id: int, user: User, bid_price: Decimal):
+    """Place a bid on an item, or raise BidRejected if it isn't accepted.
+
+    The bid is validated by a single conditional UPDATE of the highest bid
+    cached on the item, so of two concurrent bids the lower one can never
+    overwrite the higher one. Accepted bids are then inserted into the bid
+    history in the same transaction. The item is only read again to explain
+    why a bid was rejected.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        placed = (
+            Item.objects.filter(
+                Q(bid_price__isnull=True) | Q(bid_price__lt=bid_price),
+                id=item_id,
+                starting_price__lte=bid_price,
+                end_date__gt=now,
+                mail_sent=False,
+            )
+            .exclude(owner=user)
+            .update(bid_price=bid_price, bid_user=user, updated_at=now)
+        )
+        if placed:
+            Bid.objects.create(item_id=item_id, user=user, amount=bid_price)
+            invalidate(Item, item_id)
+            transaction.on_commit(bids_placed.inc)
+            return
+
+    # the bid was rejected, find out why
+    item = Item.objects.get(id=item_id)
+    if item.owner_id == user.id:
+        raise BidRejected("You cannot bid on your own items.", 401)  # unauthorized
+    if item.has_ended():
+        raise BidRejected("Item auction has ended.", 403)  # forbidden
+    if bid_price < item.starting_price:
+        raise BidRejected(
+            "Bid price cannot be less than starting price", 400, field_error=True
+        )
+    raise BidRejected(
+        "New bid price must be higher than previous pid price", 400, field_error=True
+    )
@@ -0,0 +1,80 @@
+import json
+from functools import lru_cache
+from typing import Any, Callable
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+
+from project.profiling import span
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+Encoder = Callable[[Any], bytes]
+
+_django_encoder = DjangoJSONEncoder()
+
+
+def default(o: Any) -> Any:
+    """Convert values JSON has no type for, such as Decimal prices and datetimes,
+    exactly like DjangoJSONEncoder does"""
+    return _django_encoder.default(o)
+
+
+# created once, instead of once per response like JsonResponse does
+_stdlib_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=default
+)
+
+
+def encode_stdlib(data: Any) -> bytes:
+    """Encode data as compact UTF-8 JSON with the standard library"""
+    return _stdlib_encoder.encode(data).encode()
+
+
+def encode_orjson(data: Any) -> bytes:
+    """Encode data with orjson, falling back to encode_stdlib for the data it
+    can't encode, such as integers over 64 bits.
+
+    orjson formats datetimes differently from Django, so they are passed
+    through to default() like Decimal values are. Floats may be written
+    differently from encode_stdlib, e.g. 1e16 instead of 1e+16, and decode to
+    the same values.
+    """
+    try:
+        return orjson.dumps(
+            data,
+            default=default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+        )
+    except orjson.JSONEncodeError:
+        return encode_stdlib(data)
+
+
+def encode_fastest(data: Any) -> bytes:
+    """Encode data with orjson when it is installed, or the standard library"""
+    if orjson is not None:
+        return encode_orjson(data)
+    return encode_stdlib(data)
+
+
+@lru_cache(maxsize=None)
+def get_encoder() -> Encoder:
+    """Return the encoder configured by the API_JSON_ENCODER setting"""
+    return import_string(settings.API_JSON_ENCODER)
+
+
+def encode(data: Any) -> bytes:
+    """Encode data as JSON with the configured encoder"""
+    return get_encoder()(data)
+
+
+def json_response(data: Any, status: int = 200) -> HttpResponse:
+    """Like JsonResponse, but encoded by the configured encoder"""
+    with span("serialize"):
+        body = encode(data)
+    return HttpResponse(body, content_type="application/json", status=status)
@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Optional
+
+import pytz
+from django.db.models import Count, Max
+from django.http import HttpRequest
+
+from .fieldsets import ItemRevisions
+from .models import Item, ItemQuery
+
+
+def make_etag(*parts: Any) -> str:
+    """Return a strong ETag hashing the version tokens of a response"""
+    digest = hashlib.sha1(":".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def fieldset_token(request: HttpRequest) -> str:
+    """Return the parameters shaping a response, as part of its ETag"""
+    return f"{request.GET.get('fields')}|{request.GET.get('expand')}"
+
+
+def item_etag(request: HttpRequest, item_id: int) -> Optional[str]:
+    """Return the ETag of show_item, from a single lookup of the version tokens
+    of the item and its users"""
+    if request.method != "GET":
+        return None
+
+    row = (
+        Item.objects.filter(id=item_id)
+        .values_list(
+            "updated_at",
+            "end_date",
+            "mail_sent",
+            "owner__updated_at",
+            "bid_user__updated_at",
+        )
+        .first()
+    )
+    if row is None:
+        return None
+
+    updated_at, end_date, mail_sent, owner_updated_at, bidder_updated_at = row
+    # show_item builds the body from the same rows as the ETag
+    request.item_revisions = ItemRevisions(
+        updated_at.isoformat(),
+        owner_updated_at.isoformat(),
+        bidder_updated_at.isoformat() if bidder_updated_at else None,
+    )
+    # has_ended changes with the clock, without the item being saved
+    has_ended = end_date < datetime.now(pytz.UTC) or mail_sent
+    return make_etag(
+        "item",
+        item_id,
+        *request.item_revisions,
+        has_ended,
+        fieldset_token(request),
+    )
+
+
+def item_queries_etag(request: HttpRequest, item_id: int) -> Optional[str]:
+    """Return the ETag of list_item_queries, from one aggregate over the index
+    of the item's queries"""
+    if request.method != "GET":
+        return None
+
+    versions = ItemQuery.objects.filter(item_id=item_id).aggregate(
+        count=Count("id"),
+        updated_at=Max("updated_at"),
+        askers_updated_at=Max("asked_by__updated_at"),
+    )
+    # the count changes when a query is deleted, which leaves no updated_at behind
+    return make_etag(
+        "queries",
+        item_id,
+        versions["count"],
+        versions["updated_at"],
+        versions["askers_updated_at"],
+    )
+
+
+def profile_etag(request: HttpRequest) -> Optional[str]:
+    """Return the ETag of profile, from the user already loaded for the request"""
+    if request.method != "GET":
+        return None
+
+    user = request.user
+    if not user.is_authenticated:
+        return make_etag("profile", None)
+    return make_etag("profile", user.id, user.updated_at.isoformat())
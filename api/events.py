@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, Set, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# events waiting for a slow subscriber, newer events are dropped past this
+QUEUE_SIZE = 100
+
+Subscriber = Tuple[asyncio.AbstractEventLoop, asyncio.Queue]
+
+
+class LocalBroadcaster:
+    """Fan out events to the subscribers of the current process.
+
+    Any class with the same publish/subscribe methods can replace it through the
+    EVENT_BROADCASTER setting, for example to fan out events across processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[Any, Set[Subscriber]] = defaultdict(set)
+
+    def publish(self, channel: Any, event: str, data: Any):
+        """Send an event to every subscriber of a channel. Safe to call from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._deliver, queue, (event, data))
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, message: Tuple[str, Any]):
+        """Queue a message, dropping it if the subscriber is too far behind"""
+        if not queue.full():
+            queue.put_nowait(message)
+
+    @contextmanager
+    def subscribe(self, channel: Any) -> Iterator[asyncio.Queue]:
+        """Return a queue receiving (event, data) tuples published on a channel.
+
+        Must be used from within the event loop that reads the queue.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+@lru_cache(maxsize=None)
+def get_broadcaster():
+    """Return the broadcaster configured by the EVENT_BROADCASTER setting"""
+    return import_string(settings.EVENT_BROADCASTER)()
+
+
+def item_channel(item_id: int) -> str:
+    """Return the channel name of events about one item"""
+    return f"item:{item_id}"
+
+
+def publish_item_event(item_id: int, event: str, data: Any):
+    """Publish an event about an item once the current transaction commits"""
+    transaction.on_commit(
+        lambda: get_broadcaster().publish(item_channel(item_id), event, data)
+    )
+
+
+def format_event(event: str, data: Any) -> bytes:
+    """Format an event in the Server-Sent Events wire format"""
+    encoded = json.dumps(data, cls=DjangoJSONEncoder)
+    return f"event: {event}\ndata: {encoded}\n\n".encode()
+
+
+async def event_stream(
+    channel: str, keepalive: float, max_age: float
+) -> AsyncIterator[bytes]:
+    """Yield the events of a channel in the Server-Sent Events format.
+
+    The stream ends after max_age seconds, browsers then reconnect by themselves.
+    This bounds how long a subscription outlives a client that went away.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+
+    with get_broadcaster().subscribe(channel) as queue:
+        # tell the browser how long to wait before reconnecting, in milliseconds
+        yield b"retry: 1000\n\n"
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event, data = await asyncio.wait_for(
+                    queue.get(), min(keepalive, remaining)
+                )
+            except asyncio.TimeoutError:
+                # a comment line, keeps proxies from closing an idle connection
+                yield b": keepalive\n\n"
+            else:
+                yield format_event(event, data)
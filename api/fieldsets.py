@@ -0,0 +1,241 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from django.db.models import Model, QuerySet
+from django.http import HttpRequest
+
+from userauth.models import User
+
+from .models import Item, ItemQuery
+from .serialization import get_serialization_cache
+
+
+class InvalidFieldset(ValueError):
+    """Raised when the fields or expand parameters of a request are malformed"""
+
+
+class Field(NamedTuple):
+    """An output field of a model's to_dict, and the columns it reads"""
+
+    columns: Tuple[str, ...]
+    # None for relations, which are output by fieldset_dict itself
+    get: Optional[Callable[[Any], Any]]
+
+
+# same keys, in the same order, as User.to_dict
+USER_FIELDS: Dict[str, Field] = {
+    "id": Field(("id",), lambda u: u.id),
+    "email": Field(("email",), lambda u: u.email),
+    "dob": Field(("dob",), lambda u: u.dob),
+    "avatar_path": Field(("avatar",), lambda u: u.avatar.url if u.avatar else None),
+}
+
+# every column read by User.to_dict, loaded for expanded users, and the
+# revision of their cache entries
+USER_COLUMNS = ["id", "email", "dob", "avatar", "updated_at"]
+
+# same keys, in the same order, as Item.to_dict, except for the users
+ITEM_FIELDS: Dict[str, Field] = {
+    "id": Field(("id",), lambda i: i.id),
+    "owner": Field((), None),
+    "title": Field(("title",), lambda i: i.title),
+    "desc": Field(("desc",), lambda i: i.desc),
+    "photo_path": Field(("photo",), lambda i: i.photo.url if i.photo else None),
+    "starting_price": Field(("starting_price",), lambda i: i.starting_price),
+    "bid_price": Field(("bid_price",), lambda i: i.bid_price),
+    "bid_user": Field((), None),
+    "end_date": Field(("end_date",), lambda i: i.end_date),
+    "current_price": Field(("starting_price", "bid_price"), Item.current_price),
+    "has_bids": Field(("bid_price",), lambda i: i.bid_price is not None),
+    "has_ended": Field(("end_date", "mail_sent"), Item.has_ended),
+}
+
+# user foreign keys of items, output as user dicts when expanded, or else as ids
+ITEM_RELATIONS = ("owner", "bid_user")
+
+
+class Fieldset(NamedTuple):
+    """The output fields requested by a client, and the relations to expand"""
+
+    fields: Dict[str, Field]
+    expand: FrozenSet[str]
+
+
+# what clients get without the fields and expand parameters, same as Item.to_dict
+DEFAULT_ITEM_FIELDSET = Fieldset(ITEM_FIELDS, frozenset(ITEM_RELATIONS))
+
+
+def split_parameter(request: HttpRequest, name: str) -> List[str]:
+    """Return the comma-separated values of a parameter"""
+    return [v.strip() for v in request.GET.get(name, "").split(",") if v.strip()]
+
+
+def parse_fieldset(
+    request: HttpRequest, fields: Dict[str, Field], relations: Sequence[str] = ()
+) -> Fieldset:
+    """Return the fields requested with the `fields` and `expand` parameters.
+
+    Every field is returned when `fields` isn't given. Relations among the
+    returned fields are expanded unless `expand` lists which ones to expand,
+    and relations listed in `expand` are always returned.
+    """
+    expand = None
+    if "expand" in request.GET:
+        expand = split_parameter(request, "expand")
+        unknown = [name for name in expand if name not in relations]
+        if unknown:
+            raise InvalidFieldset(f"Cannot expand: {', '.join(unknown)}")
+
+    if "fields" not in request.GET:
+        return Fieldset(fields, frozenset(relations if expand is None else expand))
+
+    requested = set(split_parameter(request, "fields")) | set(expand or ())
+    unknown = requested - fields.keys()
+    if unknown:
+        raise InvalidFieldset(f"Unknown fields: {', '.join(sorted(unknown))}")
+    if not requested:
+        raise InvalidFieldset("At least one field must be requested")
+
+    if expand is None:
+        expand = [name for name in relations if name in requested]
+    # keep the order of to_dict, whatever the order of the parameter
+    selected = {name: field for name, field in fields.items() if name in requested}
+    return Fieldset(selected, frozenset(expand))
+
+
+def fieldset_queryset(
+    objects: QuerySet, fieldset: Fieldset, always: Sequence[str] = ()
+) -> QuerySet:
+    """Only load the columns read by a fieldset, and the columns in `always`.
+
+    Expanded relations are fetched in the same query, with only the columns
+    read by User.to_dict.
+    """
+    columns = set(always)
+    for name, field in fieldset.fields.items():
+        if field.get is not None:
+            columns.update(field.columns)
+        elif name in fieldset.expand:
+            objects = objects.select_related(name)
+            columns.update(f"{name}__{c}" for c in USER_COLUMNS)
+        else:
+            # the foreign key column itself, output as the id
+            columns.add(name)
+    return objects.only(*columns)
+
+
+def fieldset_dict(obj: Model, fieldset: Fieldset) -> Dict[str, Any]:
+    """Convert an object to a JSON-serializable dictionary of a fieldset's fields"""
+    result = {}
+    for name, field in fieldset.fields.items():
+        if field.get is not None:
+            result[name] = field.get(obj)
+        elif name in fieldset.expand:
+            user = getattr(obj, name)
+            result[name] = user_dict(user.id, user) if user is not None else None
+        else:
+            result[name] = getattr(obj, f"{name}_id")
+    return result
+
+
+def project_dict(value: Dict[str, Any], fieldset: Fieldset) -> Dict[str, Any]:
+    """Select the fields of a fieldset from a complete to_dict"""
+    result = {}
+    for name, field in fieldset.fields.items():
+        result[name] = value[name]
+        if field.get is None and name not in fieldset.expand and value[name]:
+            result[name] = value[name]["id"]
+    return result
+
+
+def user_dict(
+    user_id: Optional[int],
+    user: Optional[User] = None,
+    revision: Optional[str] = None,
+):
+    """Return the User.to_dict of a user from the serialization cache, loading the
+    user unless it is given. The revision of a loaded user is its updated_at"""
+    if user_id is None:
+        return None
+    return get_serialization_cache().get_or_build(
+        User,
+        user_id,
+        lambda: (user or User.objects.only(*USER_COLUMNS).get(id=user_id)).to_dict(),
+        revision=user.updated_at.isoformat() if user else revision,
+    )
+
+
+# items are cached with the ids of their users, which are cached on their own
+ITEM_CACHED_FIELDSET = Fieldset(ITEM_FIELDS, frozenset())
+
+
+def item_expiry(value: Dict[str, Any]):
+    """Return when the cached dictionary of an item stops being valid, as its
+    has_ended field changes when the auction ends"""
+    return None if value["has_ended"] else value["end_date"]
+
+
+class ItemRevisions(NamedTuple):
+    """The updated_at of an item and of its users, as read by item_etag"""
+
+    item: str
+    owner: str
+    bid_user: Optional[str]
+
+
+def item_dict(
+    item_id: int,
+    item: Optional[Item] = None,
+    revisions: Optional[ItemRevisions] = None,
+) -> Dict[str, Any]:
+    """Return the Item.to_dict of an item from the serialization cache, loading
+    the item unless it is given.
+
+    Given the revisions the ETag of a response was computed from, its body is
+    never built from rows older than the ETag, as a stale body sent under a
+    fresh ETag would then be confirmed by every revalidation.
+    """
+
+    def build():
+        loaded = item or Item.objects.get(id=item_id)
+        return fieldset_dict(loaded, ITEM_CACHED_FIELDSET)
+
+    value = get_serialization_cache().get_or_build(
+        Item, item_id, build, item_expiry, revisions.item if revisions else None
+    )
+    return {
+        **value,
+        "owner": user_dict(
+            value["owner"], revision=revisions.owner if revisions else None
+        ),
+        "bid_user": user_dict(
+            value["bid_user"], revision=revisions.bid_user if revisions else None
+        ),
+    }
+
+
+def query_dict(query: ItemQuery) -> Dict[str, Any]:
+    """Return the ItemQuery.to_dict of a loaded query from the serialization cache.
+    The asker is loaded along with the query, so that its dict is of the same
+    revision as the ETag of list_item_queries"""
+    value = get_serialization_cache().get_or_build(
+        ItemQuery,
+        query.id,
+        lambda: {
+            "id": query.id,
+            "question": query.question,
+            "asked_by": query.asked_by_id,
+            "answer": query.answer,
+        },
+        revision=query.updated_at.isoformat(),
+    )
+    return {**value, "asked_by": user_dict(value["asked_by"], query.asked_by)}
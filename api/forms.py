@@ -1,5 +1,5 @@
 from typing import Any, Dict
-from django.forms import ModelForm
+from django.forms import DecimalField, Form, ModelForm
 from .models import Item, ItemQuery
 from userauth.models import User
 from .models import ItemQuery
@@ -21,30 +21,15 @@ class ItemForm(ModelForm):
         exclude = ["bid_price", "bid_user"]
 
 
-class BidForm(ModelForm):
-    """This is a Bid Form template"""
+class BidForm(Form):
+    """This is a Bid Form template. Bids are validated against the item when they
+    are placed (see api.bidding.place_bid), so this only parses the bid price"""
 
-    class Meta:
-        model = Item
-        fields = ["bid_user", "bid_price"]
-
-    def clean(self):
-        """Validate fields, this checks if bid_price is an invalid value"""
-        # return all fields of the form, converted and validated to the correct types
-        cleaned_data = super().clean()
-
-        starting_price = self.instance.starting_price
-        old_bid_price = self.instance.bid_price
-        new_bid_price = cleaned_data["bid_price"]
-
-        if new_bid_price is None:
-            self.add_error("bid_price", "Bid price must be provided")
-        elif old_bid_price is not None and new_bid_price <= old_bid_price:
-            self.add_error(
-                "bid_price", "New bid price must be higher than previous pid price"
-            )
-        elif new_bid_price < starting_price:
-            self.add_error("bid_price", "Bid price cannot be less than starting price")
+    bid_price = DecimalField(
+        max_digits=32,
+        decimal_places=2,
+        error_messages={"required": "Bid price must be provided"},
+    )
 
 
 class QueryAnswerForm(ModelForm):
@@ -0,0 +1,143 @@
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.jobs.check_item_completion import (
+    LEASE_DURATION,
+    claim_ended_items,
+    end_item_auction,
+    new_worker_name,
+)
+from api.models import Item
+
+logger = logging.getLogger(__name__)
+
+# items saved this long before the previous sync are fetched again, in case their
+# transaction committed after that sync ran
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class AuctionScheduler:
+    """Close auctions as they end, keeping upcoming end dates in a min-heap.
+
+    The scheduler sleeps until the next auction ends, waking up every
+    resync_interval seconds to pick up items created or edited since the last
+    sync through the updated_at index.
+    """
+
+    def __init__(self, resync_interval: float = 1.0):
+        self.resync_interval = resync_interval
+        self.worker = new_worker_name()
+        # (end_date, item id), may hold stale entries of items edited since
+        self.heap: List[Tuple[datetime, int]] = []
+        # current end date of every open item in the heap
+        self.deadlines: Dict[int, datetime] = {}
+        # when items that couldn't be closed are tried again, see retry_later
+        self.retries: Dict[int, datetime] = {}
+        self.last_sync: Optional[datetime] = None
+
+    def schedule(self, item_id: int, end_date: datetime, mail_sent: bool):
+        """Add, move or remove the deadline of an item"""
+        if mail_sent:
+            self.deadlines.pop(item_id, None)
+            self.retries.pop(item_id, None)
+            return
+        # syncs see items leased by other workers again while their updated_at
+        # is within SYNC_OVERLAP, which mustn't bring their retry forward
+        deadline = max(end_date, self.retries.get(item_id, end_date))
+        if self.deadlines.get(item_id) != deadline:
+            self.deadlines[item_id] = deadline
+            heapq.heappush(self.heap, (deadline, item_id))
+
+    def sync(self):
+        """Load the deadlines of items changed since the previous sync, or of all
+        open items on the first sync"""
+        now = timezone.now()
+        if self.last_sync is None:
+            items = Item.objects.filter(mail_sent=False)
+        else:
+            items = Item.objects.filter(updated_at__gte=self.last_sync - SYNC_OVERLAP)
+        for item_id, end_date, mail_sent in items.values_list(
+            "id", "end_date", "mail_sent"
+        ):
+            self.schedule(item_id, end_date, mail_sent)
+        self.last_sync = now
+
+    def close_due(self) -> int:
+        """Close every auction that has ended, and return how many were closed"""
+        now = timezone.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            end_date, item_id = heapq.heappop(self.heap)
+            if self.deadlines.get(item_id) != end_date:
+                # the item was edited or closed since it was pushed
+                continue
+            del self.deadlines[item_id]
+            self.retries.pop(item_id, None)
+            due.append(item_id)
+
+        if not due:
+            return 0
+
+        # the claim re-checks the items against the database, and skips those
+        # being closed by other workers
+        try:
+            items = claim_ended_items(self.worker, len(due), item_ids=due)
+        except Exception:
+            for item_id in due:
+                self.retry_later(item_id, now)
+            raise
+
+        # items leased to another worker are tried again once their lease has
+        # expired, in case that worker died. Items it closes by then are
+        # dropped by the next sync, as closing them updates updated_at
+        claimed = {item.id for item in items}
+        for item_id in due:
+            if item_id not in claimed:
+                self.retry_later(item_id, now)
+
+        closed = 0
+        for item in items:
+            try:
+                if end_item_auction(item, self.worker):
+                    closed += 1
+            except Exception:
+                logger.exception("Failed to close auction of item %d", item.id)
+                self.retry_later(item.id, now)
+        return closed
+
+    def retry_later(self, item_id: int, now: datetime):
+        """Try to close an item again once the lease of the item has expired"""
+        retry_at = now + LEASE_DURATION
+        self.retries[item_id] = retry_at
+        self.deadlines[item_id] = retry_at
+        heapq.heappush(self.heap, (retry_at, item_id))
+
+    def seconds_until_next(self) -> float:
+        """Return how long to sleep before the next auction ends or the next sync"""
+        if not self.heap:
+            return self.resync_interval
+        remaining = (self.heap[0][0] - timezone.now()).total_seconds()
+        return max(0.0, min(remaining, self.resync_interval))
+
+    def run_once(self) -> int:
+        """Sync and close the auctions that are due, return how many were closed"""
+        close_old_connections()
+        self.sync()
+        return self.close_due()
+
+    def run_forever(self):
+        """Close auctions as they end, until interrupted"""
+        while True:
+            try:
+                closed = self.run_once()
+                if closed:
+                    logger.info("Closed %d auctions", closed)
+            except Exception:
+                logger.exception("Failed to close auctions")
+            time.sleep(self.seconds_until_next())
@@ -1,28 +1,148 @@
-from datetime import datetime
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
 
 import api.mailer as mailer
 from api.models import Item
+from api.serialization import invalidate
+from project.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+auctions_closed = Counter("auction_auctions_closed_total", "Auctions ended")
+
+# how long a worker may hold ended items before other workers can claim them
+LEASE_DURATION = timedelta(minutes=5)
+# number of ended items claimed by a worker at a time
+BATCH_SIZE = 100
+
+
+def new_worker_name() -> str:
+    """Return a name identifying a worker uniquely across processes and nodes"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_ended_items(
+    worker: str, batch_size: int = BATCH_SIZE, item_ids: Optional[Iterable[int]] = None
+) -> List[Item]:
+    """Lease a batch of ended items to a worker, and return them.
+
+    An item is leased to a single worker at a time, until LEASE_DURATION has passed.
+    On databases supporting it, candidate rows locked by other workers are skipped
+    (SELECT ... FOR UPDATE SKIP LOCKED). Elsewhere, such as SQLite, the conditional
+    UPDATE taking the lease is what keeps two workers from claiming the same item.
+    """
+    now = timezone.now()
+    lease_expires = now + LEASE_DURATION
+    claimable = Q(lease_expires__isnull=True) | Q(lease_expires__lt=now)
+
+    candidates = Item.objects.filter(claimable, end_date__lte=now, mail_sent=False)
+    if item_ids is not None:
+        candidates = candidates.filter(id__in=list(item_ids))
+    candidates = candidates.order_by("end_date")
 
+    def take_lease(ids: List[int]):
+        Item.objects.filter(claimable, id__in=ids, mail_sent=False).update(
+            lease_owner=worker, lease_expires=lease_expires, updated_at=now
+        )
 
-def end_item_auction(item: Item):
-    """Send emails to item owner and bidder, and mark the item as ended"""
-    # Send email to bidder if there is one
-    if item.bid_user:
-        mailer.highest_bidder(item)
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list("id", flat=True)[:batch_size])
+            take_lease(ids)
+    else:
+        # no transaction here: on SQLite, two transactions that read and then
+        # write deadlock each other, while a lone UPDATE just waits for its turn
+        ids = list(candidates.values_list("id", flat=True)[:batch_size])
+        take_lease(ids)
 
-    # Send email to owner no matter what
-    mailer.auction_ended(item)
+    return list(
+        Item.objects.select_related("owner", "bid_user").filter(
+            id__in=ids, lease_owner=worker, mail_sent=False
+        )
+    )
 
-    item.mail_sent = True
-    item.save()
+
+def end_item_auction(item: Item, worker: str = "") -> bool:
+    """Queue emails to item owner and bidder, and mark the item as ended.
+
+    The item must be leased to the worker (see claim_ended_items). Returns False,
+    without queueing anything, if the item was already ended by someone else.
+    """
+    return end_item_auctions([item], worker) == 1
+
+
+def end_item_auctions(items: List[Item], worker: str = "") -> int:
+    """Queue the emails of many items, and mark the items as ended.
+
+    Items that aren't leased to the worker anymore are skipped. Both happen in
+    one transaction, so the emails of an item are queued exactly once; the
+    outbox worker then sends them. Returns how many items were ended.
+    """
+    ids = [i.id for i in items]
+    with transaction.atomic():
+        # the lease owner is kept, to find out which items were ended here
+        Item.objects.filter(id__in=ids, lease_owner=worker, mail_sent=False).update(
+            mail_sent=True, lease_expires=None, updated_at=timezone.now()
+        )
+        ended = set(
+            Item.objects.filter(
+                id__in=ids, lease_owner=worker, mail_sent=True
+            ).values_list("id", flat=True)
+        )
+        mailer.enqueue(
+            mail
+            for item in items
+            if item.id in ended
+            for mail in mailer.auction_mails(item)
+        )
+        for item_id in ended:
+            invalidate(Item, item_id)
+    auctions_closed.inc(len(ended))
+    return len(ended)
 
 
 def ended_items():
     """Return all items that have ended but haven't sent emails"""
-    return Item.objects.filter(end_date__lte=datetime.now(), mail_sent=False)
+    return Item.objects.filter(end_date__lte=timezone.now(), mail_sent=False)
+
+
+def close_ended_items(worker: str, batch_size: int = BATCH_SIZE) -> int:
+    """Claim and end batches of ended items until there are none left, and return
+    how many were ended"""
+    closed = 0
+    while True:
+        items = claim_ended_items(worker, batch_size)
+        if not items:
+            return closed
+        try:
+            closed += end_item_auctions(items, worker)
+        except Exception:
+            logger.exception("Failed to close auctions of %d items", len(items))
+
+
+def run(workers: int = 1, batch_size: int = BATCH_SIZE) -> int:
+    """Check if any items have ended, and send emails to items' owners and bidders.
+
+    Safe to run from several processes or nodes at once. Items are spread across
+    `workers` threads, and the number of items ended is returned.
+    """
 
+    def work(_):
+        close_old_connections()
+        try:
+            return close_ended_items(new_worker_name(), batch_size)
+        finally:
+            connection.close()
 
-def run():
-    """Check if any items have ended, and send emails to items' owners and bidders"""
-    for i in ended_items():
-        end_item_auction(i)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(work, range(workers)))
@@ -1,10 +1,27 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Pattern, Sequence, Tuple
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from userauth.models import User
-from api.models import Item
+from api.models import Item, Outbox
+import hashlib
 import textwrap
 import re
 
+# number of backend connections used in parallel by send_batch
+BATCH_CONNECTIONS = 4
+
+
+class Mail(NamedTuple):
+    """An email to be queued in the outbox"""
+
+    # idempotency key, an email is only sent once per key
+    key: str
+    subject: str
+    message: str
+    email: str
+
 
 def print_mail(subject: str, message: str, email: str):
     """Print the email in console"""
@@ -15,23 +32,103 @@ def print_mail(subject: str, message: str, email: str):
     print("---------------------------------------------")
 
 
-def send_or_print_mail(subject: str, message: str, email: str):
-    """Send an email to a user. If PRINT_EMAILS is set to true, then just print the email in console and skip sending"""
-    if settings.PRINT_EMAILS:
-        for allowed_regex in settings.PRINT_PERMITTED_EMAILS_REGEX:
-            match = re.search(allowed_regex, email)
-            if match:
-                # email permitted, send email
-                send_mail(subject, message, None, [email], fail_silently=False)
-                return
+@lru_cache(maxsize=None)
+def compile_permitted_emails(regexes: Tuple[str, ...]) -> Pattern:
+    """Combine the regexes of permitted emails into a single compiled pattern"""
+    return re.compile("|".join(f"(?:{r})" for r in regexes))
+
+
+def is_permitted_email(email: str) -> bool:
+    """Return whether an email can be sent while PRINT_EMAILS is active"""
+    pattern = compile_permitted_emails(tuple(settings.PRINT_PERMITTED_EMAILS_REGEX))
+    return pattern.search(email) is not None
+
+
+def message_id(key: str) -> str:
+    """Return a Message-ID derived from an idempotency key, so that an email
+    sent twice after a crash can be recognised as the same email"""
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return f"<{digest}@fbay>"
 
+
+def build_mail(
+    subject: str, message: str, email: str, key: Optional[str] = None
+) -> Optional[EmailMessage]:
+    """Build an email to a user. If PRINT_EMAILS is set to true, then just print the email in console and return None"""
+    if settings.PRINT_EMAILS and not is_permitted_email(email):
         print_mail(subject, message, email)
+        return None
+
+    headers = {"Message-ID": message_id(key)} if key else None
+    return EmailMessage(subject, message, None, [email], headers=headers)
+
+
+def send_or_print_mail(subject: str, message: str, email: str):
+    """Send an email to a user. If PRINT_EMAILS is set to true, then just print the email in console and skip sending"""
+    mail = build_mail(subject, message, email)
+    if mail is not None:
+        mail.send(fail_silently=False)
+
+
+def send_batch(
+    mails: Sequence[Optional[EmailMessage]], connections: int = BATCH_CONNECTIONS
+) -> List[Optional[Exception]]:
+    """Send many emails reusing a few backend connections, and return the error
+    of each email, or None for the emails that were sent.
+
+    The emails are split between up to `connections` threads, each sending its
+    share over a single connection. None values, for printed emails, are skipped.
+    """
+    errors: List[Optional[Exception]] = [None] * len(mails)
+    pending = [i for i, m in enumerate(mails) if m is not None]
+    if not pending:
+        return errors
+
+    shares = [pending[i::connections] for i in range(min(connections, len(pending)))]
+
+    def send_share(share: List[int]):
+        try:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+        except Exception as e:
+            for i in share:
+                errors[i] = e
+            return
+
+        try:
+            for i in share:
+                try:
+                    connection.send_messages([mails[i]])
+                except Exception as e:
+                    errors[i] = e
+        finally:
+            connection.close()
+
+    if len(shares) == 1:
+        send_share(shares[0])
     else:
-        send_mail(subject, message, None, [email], fail_silently=False)
+        with ThreadPoolExecutor(max_workers=len(shares)) as executor:
+            list(executor.map(send_share, shares))
+    return errors
+
+
+def enqueue(mails: Iterable[Mail]):
+    """Queue emails in the outbox, to be sent by the outbox worker (see api.outbox).
+
+    Emails whose key is already in the outbox are ignored, so enqueueing the
+    same email twice only sends it once.
+    """
+    Outbox.objects.bulk_create(
+        [
+            Outbox(key=m.key, subject=m.subject, message=m.message, email=m.email)
+            for m in mails
+        ],
+        ignore_conflicts=True,
+    )
 
 
-def highest_bidder(item: Item):
-    """Send an "auction ended" email to the highest bidder of an item"""
+def highest_bidder_mail(item: Item) -> Mail:
+    """Build an "auction ended" email to the highest bidder of an item"""
     user = item.bid_user
     if user is None:
         raise RuntimeError("Item does not have a bidder!")
@@ -49,11 +146,16 @@ def highest_bidder(item: Item):
         """
     )
 
-    send_or_print_mail(subject, message, user.email)
+    return Mail(f"highest-bidder:{item.id}", subject, message, user.email)
 
 
-def auction_ended(item: Item):
-    """Send an "auction ended" email to the owner of an item"""
+def highest_bidder(item: Item):
+    """Send an "auction ended" email to the highest bidder of an item"""
+    enqueue([highest_bidder_mail(item)])
+
+
+def auction_ended_mail(item: Item) -> Mail:
+    """Build an "auction ended" email to the owner of an item"""
     if item.bid_user is None:
         # no one bid on the item
         subject = f"Auction ended - There were no bidders on your item {item.title}"
@@ -77,11 +179,28 @@ def auction_ended(item: Item):
             """
         )
 
-    send_or_print_mail(subject, message, item.owner.email)
+    return Mail(f"auction-ended:{item.id}", subject, message, item.owner.email)
 
 
-def welcome_user(user: User):
-    """Send a welcome email to a user"""
+def auction_ended(item: Item):
+    """Send an "auction ended" email to the owner of an item"""
+    enqueue([auction_ended_mail(item)])
+
+
+def auction_mails(item: Item) -> List[Mail]:
+    """Build every email sent when the auction of an item ends"""
+    mails = []
+    # Send email to bidder if there is one
+    if item.bid_user:
+        mails.append(highest_bidder_mail(item))
+
+    # Send email to owner no matter what
+    mails.append(auction_ended_mail(item))
+    return mails
+
+
+def welcome_mail(user: User) -> Mail:
+    """Build a welcome email to a user"""
     subject = f"Welcome to fBay!"
 
     message = textwrap.dedent(
@@ -93,4 +212,9 @@ def welcome_user(user: User):
         """
     )
 
-    send_or_print_mail(subject, message, user.email)
+    return Mail(f"welcome:{user.id}", subject, message, user.email)
+
+
+def welcome_user(user: User):
+    """Send a welcome email to a user"""
+    enqueue([welcome_mail(user)])
@@ -0,0 +1,348 @@
+import http.client
+import itertools
+import json
+import random
+import re
+import socket
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api.benchmark import Stopwatch, benchmark_database, latency_summary
+from api.models import Bid, Item, ItemQuery
+from userauth.models import User
+
+# words item titles are made of, and searched for
+ADJECTIVES = ["vintage", "rare", "antique", "signed", "mint", "boxed", "retro", "used"]
+NOUNS = ["guitar", "camera", "watch", "poster", "vinyl", "console", "lamp", "bike"]
+
+# bids of the benchmark are above every seeded bid, so that most are accepted
+SEEDED_BID_MAX = 10000
+
+# how the profiling middleware reports the queries of a request
+QUERIES_PATTERN = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+class Request(NamedTuple):
+    """A request of a scenario"""
+
+    method: str
+    path: str
+    body: Optional[Dict[str, Any]] = None
+
+
+class Result(NamedTuple):
+    """The outcome of a request"""
+
+    status: int
+    seconds: float
+    queries: Optional[int]
+
+
+class Dataset(NamedTuple):
+    """The ids of the seeded objects that requests are built from"""
+
+    bidders: List[int]
+    open_items: List[int]
+    items: List[int]
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler that doesn't log every request"""
+
+    def setup(self):
+        super().setup()
+        # headers and body are written separately, which Nagle's algorithm
+        # would hold back until the client's delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database with users, items, bids and queries, then "
+        "drive the main api endpoints through the test client and over HTTP "
+        "from several threads, and report their throughput, latency and SQL "
+        "queries as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--items", type=int, default=5000)
+        parser.add_argument("--bids", type=int, default=20000)
+        parser.add_argument("--queries", type=int, default=5000)
+        parser.add_argument(
+            "--requests", type=int, default=500, help="requests per scenario"
+        )
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument(
+            "--driver", choices=["client", "http", "both"], default="both"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="random seed, for comparable runs"
+        )
+        parser.add_argument(
+            "--output", help="also write the results to this file, to diff runs"
+        )
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        # the Server-Timing header of every request tells how many queries it ran
+        with override_settings(PROFILING_SAMPLE_RATE=1.0), benchmark_database():
+            with Stopwatch() as seeding:
+                dataset = self.seed(options)
+            result = {
+                "vendor": connection.vendor,
+                "dataset": {
+                    name: options[name]
+                    for name in ("users", "items", "bids", "queries")
+                },
+                "seed_seconds": round(seeding.elapsed, 3),
+                "requests_per_scenario": options["requests"],
+            }
+            if options["driver"] in ("client", "both"):
+                result["client"] = self.run_client(dataset, options["requests"])
+            if options["driver"] in ("http", "both"):
+                result["http"] = self.run_http(
+                    dataset, options["requests"], options["threads"]
+                )
+                result["http_threads"] = options["threads"]
+
+        output = json.dumps(result, indent=2, sort_keys=True)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+
+    def seed(self, options) -> Dataset:
+        """Fill the database, and return the ids requests are built from"""
+        # hashing is slow on purpose, every user gets the same password hash
+        template = User()
+        template.set_password("bench")
+        users = User.objects.bulk_create(
+            User(
+                email=f"user{i}@bench.local",
+                password=template.password,
+                dob="2000-01-01",
+            )
+            for i in range(options["users"])
+        )
+        user_ids = [u.id for u in users]
+        # half of the users sell, the other half bid
+        sellers = user_ids[: len(user_ids) // 2] or user_ids
+        bidders = user_ids[len(user_ids) // 2 :] or user_ids
+
+        now = timezone.now()
+        items = Item.objects.bulk_create(
+            Item(
+                owner_id=random.choice(sellers),
+                title=f"{random.choice(ADJECTIVES)} {random.choice(NOUNS)} {i}",
+                desc=" ".join(random.choices(ADJECTIVES + NOUNS, k=12)),
+                starting_price=Decimal(random.randint(1, 100)),
+                # a tenth of the auctions have ended
+                end_date=now + timedelta(hours=random.randint(-72, 648)),
+            )
+            for i in range(options["items"])
+        )
+
+        bids = [
+            (
+                random.choice(items),
+                random.choice(bidders),
+                Decimal(random.randint(100, SEEDED_BID_MAX)),
+            )
+            for _ in range(options["bids"])
+            if items
+        ]
+        Bid.objects.bulk_create(
+            Bid(item=item, user_id=user_id, amount=amount)
+            for item, user_id, amount in bids
+        )
+        # the highest bid of each item is cached on it
+        highest: Dict[int, Tuple[Decimal, int]] = {}
+        for item, user_id, amount in bids:
+            highest[item.id] = max(
+                highest.get(item.id, (amount, user_id)), (amount, user_id)
+            )
+        for item in items:
+            if item.id in highest:
+                item.bid_price, item.bid_user_id = highest[item.id]
+        Item.objects.bulk_update(items, ["bid_price", "bid_user"], batch_size=500)
+
+        ItemQuery.objects.bulk_create(
+            ItemQuery(
+                item=random.choice(items),
+                asked_by_id=random.choice(bidders),
+                question=f"Is the {random.choice(NOUNS)} working?",
+                answer=random.choice([None, "Yes, it is."]),
+            )
+            for _ in range(options["queries"])
+            if items
+        )
+
+        return Dataset(
+            bidders=bidders,
+            open_items=[i.id for i in items if i.end_date > now],
+            items=[i.id for i in items],
+        )
+
+    def scenarios(self, dataset: Dataset) -> Dict[str, Callable[[], Request]]:
+        """Return the scenarios, each building the requests it is made of"""
+        prices = itertools.count(SEEDED_BID_MAX + 1)
+        return {
+            "list_items": lambda: Request("GET", "/api/items/?limit=20"),
+            "search": lambda: Request(
+                "GET", f"/api/items/?limit=20&q={random.choice(NOUNS)}"
+            ),
+            "show_item": lambda: Request(
+                "GET", f"/api/items/{random.choice(dataset.items)}/"
+            ),
+            "bid_item": lambda: Request(
+                "PUT",
+                f"/api/items/{random.choice(dataset.open_items)}/bid/",
+                {"bid_price": str(next(prices))},
+            ),
+            "list_item_queries": lambda: Request(
+                "GET", f"/api/items/{random.choice(dataset.items)}/queries/"
+            ),
+        }
+
+    def run_client(self, dataset: Dataset, count: int) -> Dict[str, Any]:
+        """Send the requests of every scenario with the test client, one at a time"""
+        client = Client()
+        client.force_login(User.objects.get(id=dataset.bidders[0]))
+
+        def send(request: Request) -> Result:
+            with Stopwatch() as watch:
+                response = client.generic(
+                    request.method,
+                    request.path,
+                    json.dumps(request.body) if request.body else "",
+                    content_type="application/json",
+                )
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            return Result(
+                response.status_code, watch.elapsed, queries_of(response.headers)
+            )
+
+        return {
+            name: summarize([send(build()) for _ in range(count)])
+            for name, build in self.scenarios(dataset).items()
+        }
+
+    def run_http(self, dataset: Dataset, count: int, threads: int) -> Dict[str, Any]:
+        """Send the requests of every scenario over HTTP to a threaded server,
+        from several client threads each with their own session"""
+        server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        server.set_app(WSGIHandler())
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+
+        cookies = []
+        for i in range(threads):
+            client = Client()
+            client.force_login(
+                User.objects.get(id=dataset.bidders[i % len(dataset.bidders)])
+            )
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            cookies.append(f"{settings.SESSION_COOKIE_NAME}={session}")
+
+        try:
+            return {
+                name: self.run_http_scenario(server, build, count, cookies)
+                for name, build in self.scenarios(dataset).items()
+            }
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def run_http_scenario(
+        self,
+        server: ThreadedWSGIServer,
+        build: Callable[[], Request],
+        count: int,
+        cookies: List[str],
+    ) -> Dict[str, Any]:
+        """Send the requests of one scenario, shared between the client threads"""
+        host, port = server.server_address
+        lock = threading.Lock()
+        results: List[Result] = []
+        remaining = iter(range(count))
+
+        def client(cookie: str):
+            conn = open_connection(host, port)
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                    request = build()
+                body = json.dumps(request.body) if request.body else None
+                headers = {"Cookie": cookie, "Content-Type": "application/json"}
+                with Stopwatch() as watch:
+                    conn.request(request.method, request.path, body, headers)
+                    response = conn.getresponse()
+                    response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    conn.close()
+                    conn = open_connection(host, port)
+                result = Result(
+                    response.status, watch.elapsed, queries_of(response.headers)
+                )
+                with lock:
+                    results.append(result)
+            conn.close()
+
+        workers = [threading.Thread(target=client, args=(c,)) for c in cookies]
+        with Stopwatch() as total:
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+        return summarize(results, total.elapsed)
+
+
+def open_connection(host: str, port: int) -> http.client.HTTPConnection:
+    """Open a keep-alive connection to the server, sending requests right away"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.connect()
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return conn
+
+
+def queries_of(headers) -> Optional[int]:
+    """Return the number of queries of a response, from its Server-Timing header"""
+    match = QUERIES_PATTERN.search(headers.get("Server-Timing", ""))
+    return int(match.group(1)) if match else None
+
+
+def summarize(results: List[Result], elapsed: Optional[float] = None) -> Dict[str, Any]:
+    """Summarize the results of a scenario. Sequential requests take the sum of
+    their durations, concurrent ones are given the duration of the scenario"""
+    if elapsed is None:
+        elapsed = sum(r.seconds for r in results)
+    queries = [r.queries for r in results if r.queries is not None]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r.status)] = statuses.get(str(r.status), 0) + 1
+    return {
+        "requests": len(results),
+        "requests_per_second": round(len(results) / elapsed, 1) if elapsed else 0.0,
+        **latency_summary([r.seconds for r in results]),
+        "queries_per_request": (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+        "statuses": statuses,
+    }
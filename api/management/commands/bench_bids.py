@@ -0,0 +1,123 @@
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from api.benchmark import Stopwatch, benchmark_database, latency_summary
+from api.bidding import BidRejected, place_bid
+from api.models import Item
+from userauth.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Place concurrent bids on a single item from many threads, and check "
+        "that no accepted bid was lost"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--bids", type=int, default=250, help="bids per thread")
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            result = self.run_benchmark(options["threads"], options["bids"])
+        self.stdout.write(json.dumps(result, indent=2))
+        if not result["accepted"]:
+            raise CommandError("No bid was accepted")
+        if result["lost_updates"]:
+            raise CommandError("Accepted bids were lost")
+
+    def run_benchmark(self, threads: int, bids: int):
+        """Run the benchmark, and return its results as a dictionary"""
+        owner = User.objects.create_user(
+            email="owner@bench.local", password="bench", dob="2000-01-01"
+        )
+        bidders = [
+            User.objects.create_user(
+                email=f"bidder{i}@bench.local", password="bench", dob="2000-01-01"
+            )
+            for i in range(threads)
+        ]
+        item = Item.objects.create(
+            owner=owner,
+            title="Hot item",
+            starting_price=Decimal("1.00"),
+            end_date=timezone.now() + timedelta(days=1),
+        )
+
+        # every bid amount is unique, so the winner can be checked exactly, and
+        # each thread raises its own bids so that they race each other
+        amounts = list(range(1, threads * bids + 1))
+
+        lock = threading.Lock()
+        accepted = []
+        rejected = 0
+        errors = 0
+        latencies = []
+
+        def bidder(index: int):
+            nonlocal rejected, errors
+            user = bidders[index]
+            for amount in amounts[index::threads]:
+                price = Decimal(amount)
+                with Stopwatch() as watch:
+                    try:
+                        place_bid(item.id, user, price)
+                        outcome = "accepted"
+                    except BidRejected:
+                        outcome = "rejected"
+                    except OperationalError:
+                        # e.g. SQLite's "database is locked" under write contention
+                        outcome = "error"
+                with lock:
+                    latencies.append(watch.elapsed)
+                    if outcome == "accepted":
+                        accepted.append((price, user.id))
+                    elif outcome == "rejected":
+                        rejected += 1
+                    else:
+                        errors += 1
+            connection.close()
+
+        workers = [threading.Thread(target=bidder, args=(i,)) for i in range(threads)]
+        with Stopwatch() as total:
+            for w in workers:
+                w.start()
+            for w in workers:
+                w.join()
+
+        item.refresh_from_db()
+        if not accepted:
+            # e.g. every bid hit a lock timeout, nothing to check the item against
+            return {
+                "vendor": connection.vendor,
+                "threads": threads,
+                "bids": threads * bids,
+                "seconds": round(total.elapsed, 3),
+                "accepted": 0,
+                "rejected": rejected,
+                "errors": errors,
+                "lost_updates": None,
+            }
+
+        highest_price, highest_user = max(accepted)
+        return {
+            "vendor": connection.vendor,
+            "threads": threads,
+            "bids": threads * bids,
+            "seconds": round(total.elapsed, 3),
+            "bids_per_second": round(threads * bids / total.elapsed, 1),
+            **latency_summary(latencies),
+            "accepted": len(accepted),
+            "rejected": rejected,
+            "errors": errors,
+            "final_bid_price": str(item.bid_price),
+            "highest_accepted_bid": str(highest_price),
+            "lost_updates": item.bid_price != highest_price
+            or item.bid_user_id != highest_user,
+        }
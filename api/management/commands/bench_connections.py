@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from api.benchmark import Stopwatch, benchmark_database, latency_summary
+from api.models import Item
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare closing the database connection after every request against "
+        "persistent connections, on a throwaway copy of the default database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--conn-max-age", type=int, default=60)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            result = {"requests": options["requests"], "vendor": connection.vendor}
+            for name, conn_max_age in (
+                ("per_request", 0),
+                ("persistent", options["conn_max_age"]),
+            ):
+                result[name] = self.run(options["requests"], conn_max_age)
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def run(self, count: int, conn_max_age: int):
+        """Run count requests making one query each, the way the request handler
+        opens and closes connections, and return their latencies"""
+        connection.close()
+        connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+
+        connects = 0
+
+        def count_connect(**kwargs):
+            nonlocal connects
+            connects += 1
+
+        connection_created.connect(count_connect)
+        samples = []
+        try:
+            with Stopwatch() as total:
+                for _ in range(count):
+                    with Stopwatch() as request:
+                        request_started.send(sender=self.__class__)
+                        Item.objects.exists()
+                        request_finished.send(sender=self.__class__)
+                    samples.append(request.elapsed)
+        finally:
+            connection_created.disconnect(count_connect)
+            connection.close()
+
+        return {
+            "conn_max_age": conn_max_age,
+            "connections_opened": connects,
+            "requests_per_second": round(count / total.elapsed, 1),
+            **latency_summary(samples),
+        }
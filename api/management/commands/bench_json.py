@@ -0,0 +1,78 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from api import encoders
+from api.benchmark import Stopwatch
+from api.models import Item
+from userauth.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare encoding Item.to_dict() payloads with DjangoJSONEncoder against "
+        "the encoders of api.encoders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        payload = {"status": "OK", "value": self.build_payload(options["items"])}
+        candidates = {
+            "django_json_encoder": lambda data: json.dumps(
+                data, cls=DjangoJSONEncoder
+            ).encode(),
+            "stdlib": encoders.encode_stdlib,
+        }
+        if encoders.orjson is not None:
+            candidates["orjson"] = encoders.encode_orjson
+
+        outputs = {}
+        timings = {}
+        for name, encode in candidates.items():
+            best = None
+            for _ in range(options["repeat"]):
+                with Stopwatch() as stopwatch:
+                    outputs[name] = encode(payload)
+                best = min(best or stopwatch.elapsed, stopwatch.elapsed)
+            timings[name] = best
+
+        # the payload must survive every encoder unchanged
+        decoded = [json.loads(output) for output in outputs.values()]
+        assert all(d == decoded[0] for d in decoded)
+
+        result = {
+            "items": options["items"],
+            "payloads_per_second": {
+                name: round(options["items"] / elapsed, 1)
+                for name, elapsed in timings.items()
+            },
+            "bytes": {name: len(output) for name, output in outputs.items()},
+        }
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def build_payload(self, count: int):
+        """Return the to_dict() of unsaved items, so no database is needed"""
+        now = timezone.now()
+        owner = User(id=1, email="owner@bench.local", dob=now.date())
+        bidder = User(id=2, email="bidder@bench.local", dob=now.date())
+        items = [
+            Item(
+                id=i,
+                owner=owner,
+                title=f"Item {i}",
+                desc="A fine item, barely used. " * 4,
+                starting_price=Decimal("10.00"),
+                bid_price=Decimal(f"{10 + i % 500}.50") if i % 2 else None,
+                bid_user=bidder if i % 2 else None,
+                end_date=now + timedelta(minutes=i, microseconds=i),
+            )
+            for i in range(count)
+        ]
+        return [item.to_dict() for item in items]
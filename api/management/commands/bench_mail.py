@@ -0,0 +1,54 @@
+import json
+
+from django.core import mail
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from api import mailer
+from api.benchmark import Stopwatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sending emails one at a time against api.mailer.send_batch, "
+        "using the locmem email backend"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10000)
+        parser.add_argument("--connections", type=int, default=mailer.BATCH_CONNECTIONS)
+
+    def handle(self, *args, **options):
+        count = options["messages"]
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            PRINT_EMAILS=True,
+        ):
+            # permitted addresses, so that every email goes through the backend
+            addresses = [f"user{i}@gmail.com" for i in range(count)]
+
+            mail.outbox = []
+            with Stopwatch() as single:
+                for email in addresses:
+                    mailer.send_or_print_mail("Subject", "Message", email)
+            assert len(mail.outbox) == count
+
+            mail.outbox = []
+            with Stopwatch() as batch:
+                mailer.send_batch(
+                    [
+                        mailer.build_mail("Subject", "Message", email)
+                        for email in addresses
+                    ],
+                    connections=options["connections"],
+                )
+            assert len(mail.outbox) == count
+
+        result = {
+            "messages": count,
+            "backend": "locmem",
+            "single_messages_per_second": round(count / single.elapsed, 1),
+            "batch_messages_per_second": round(count / batch.elapsed, 1),
+            "batch_connections": options["connections"],
+        }
+        self.stdout.write(json.dumps(result, indent=2))
@@ -0,0 +1,166 @@
+import json
+import random
+import multiprocessing
+import time
+from multiprocessing.queues import Queue
+from datetime import timedelta
+from decimal import Decimal
+from typing import List
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from api.benchmark import Stopwatch, benchmark_database, latency_summary
+from api.bidding import BidRejected, place_bid
+from api.models import Item
+from project.database import sqlite_pragmas
+from userauth.models import User
+
+# SQLite's defaults, which Django doesn't change
+ROLLBACK_JOURNAL_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of readers while bids are being placed, with "
+        "SQLite's default rollback journal against the pragmas of "
+        "project.database.sqlite_pragmas"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--writers", type=int, default=2)
+        parser.add_argument("--seconds", type=float, default=5)
+        parser.add_argument("--items", type=int, default=500)
+        parser.add_argument(
+            "--bid-interval",
+            type=float,
+            default=0.01,
+            help="seconds each writer waits between bids, so that both modes "
+            "are compared under the same write load",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark only runs on SQLite")
+
+        result = {
+            "readers": options["readers"],
+            "writers": options["writers"],
+            "seconds": options["seconds"],
+        }
+        original = connection.settings_dict.get("SQLITE_PRAGMAS")
+        try:
+            for name, pragmas in (
+                ("rollback_journal", ROLLBACK_JOURNAL_PRAGMAS),
+                ("tuned", sqlite_pragmas() or None),
+            ):
+                # applied by every connection of the benchmark database
+                connection.settings_dict["SQLITE_PRAGMAS"] = pragmas
+                with benchmark_database():
+                    result[name] = {
+                        "pragmas": pragmas,
+                        **self.run_benchmark(options),
+                    }
+        finally:
+            connection.settings_dict["SQLITE_PRAGMAS"] = original
+        self.stdout.write(json.dumps(result, indent=2))
+
+    def run_benchmark(self, options):
+        """Read random items from some processes while others place bids on
+        them, and return the results as a dictionary"""
+        owner = User.objects.create_user(
+            email="owner@bench.local", password="bench", dob="2000-01-01"
+        )
+        bidders = [
+            User.objects.create_user(
+                email=f"bidder{i}@bench.local", password="bench", dob="2000-01-01"
+            )
+            for i in range(options["writers"])
+        ]
+        end_date = timezone.now() + timedelta(days=1)
+        Item.objects.bulk_create(
+            Item(
+                owner=owner,
+                title=f"Item {i}",
+                starting_price=Decimal("1.00"),
+                end_date=end_date,
+            )
+            for i in range(options["items"])
+        )
+        item_ids = list(Item.objects.values_list("id", flat=True))
+
+        deadline = time.time() + options["seconds"]
+        # separate processes, like gunicorn workers, so that the GIL doesn't
+        # serialize readers and writers
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        connection.close()
+        processes = [
+            context.Process(target=read, args=(item_ids, deadline, results))
+            for _ in range(options["readers"])
+        ]
+        processes += [
+            context.Process(
+                target=write,
+                args=(item_ids, user, deadline, options["bid_interval"], results),
+            )
+            for user in bidders
+        ]
+
+        with Stopwatch() as total:
+            for p in processes:
+                p.start()
+            outcomes = [results.get() for _ in processes]
+            for p in processes:
+                p.join()
+
+        read_latencies = [s for o in outcomes for s in o.get("latencies", [])]
+        bids = sum(o.get("bids", 0) for o in outcomes)
+        errors = sum(o["errors"] for o in outcomes)
+        return {
+            "reads_per_second": round(len(read_latencies) / total.elapsed, 1),
+            **latency_summary(read_latencies),
+            "bids_per_second": round(bids / total.elapsed, 1),
+            "errors": errors,
+        }
+
+
+def read(item_ids: List[int], deadline: float, results: Queue):
+    """Read random items until the deadline, in a worker process"""
+    latencies = []
+    errors = 0
+    while time.time() < deadline:
+        with Stopwatch() as watch:
+            try:
+                Item.objects.get(id=random.choice(item_ids)).to_dict()
+                list(Item.objects.order_by("-end_date", "-id")[:20])
+            except OperationalError:
+                errors += 1
+                continue
+        latencies.append(watch.elapsed)
+    connection.close()
+    results.put({"latencies": latencies, "errors": errors})
+
+
+def write(
+    item_ids: List[int], user: User, deadline: float, interval: float, results: Queue
+):
+    """Place bids on random items until the deadline, in a worker process"""
+    bids = 0
+    errors = 0
+    price = Decimal("1.00")
+    while time.time() < deadline:
+        price += 1
+        try:
+            place_bid(random.choice(item_ids), user, price)
+            bids += 1
+        except BidRejected:
+            pass
+        except OperationalError:
+            # "database is locked" once busy_timeout runs out
+            errors += 1
+        time.sleep(interval)
+    connection.close()
+    results.put({"bids": bids, "errors": errors})
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.jobs import check_item_completion
+
+
+class Command(BaseCommand):
+    help = (
+        "Close every auction that has ended and send its emails. Safe to run "
+        "from several processes or nodes at once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1, help="number of worker threads"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=check_item_completion.BATCH_SIZE,
+            help="number of items claimed by a worker at a time",
+        )
+
+    def handle(self, *args, **options):
+        closed = check_item_completion.run(
+            workers=options["workers"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(f"Closed {closed} auctions")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api.jobs.auction_scheduler import AuctionScheduler
+
+
+class Command(BaseCommand):
+    help = "Close auctions as soon as they end, running until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--resync-interval",
+            type=float,
+            default=1.0,
+            help="seconds between checks for created or edited items",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="close the auctions that have already ended, then exit",
+        )
+
+    def handle(self, *args, **options):
+        scheduler = AuctionScheduler(resync_interval=options["resync_interval"])
+        if options["once"]:
+            closed = scheduler.run_once()
+            self.stdout.write(f"Closed {closed} auctions")
+            return
+
+        self.stdout.write("Waiting for auctions to end...")
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
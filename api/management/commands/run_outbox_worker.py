@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from api import outbox
+from api.jobs.check_item_completion import new_worker_name
+
+
+class Command(BaseCommand):
+    help = "Send the emails queued in the outbox, running until interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="seconds between checks for new emails",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help="number of emails sent at a time",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="send the emails that are due, then exit",
+        )
+
+    def handle(self, *args, **options):
+        worker = new_worker_name()
+        if options["once"]:
+            sent = outbox.process_outbox(worker, options["batch_size"])
+            self.stdout.write(f"Sent {sent} emails")
+            return
+
+        self.stdout.write("Waiting for emails to send...")
+        try:
+            outbox.run_forever(worker, options["poll_interval"], options["batch_size"])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_item_mail_sent"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["end_date", "id"], name="item_end_date_id_idx"),
+        ),
+    ]
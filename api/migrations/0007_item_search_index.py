@@ -0,0 +1,41 @@
+from django.db import migrations
+
+from api.search import POSTGRES_VECTOR, SQLITE_FTS_TABLE, SQLITE_INDEX_STATEMENTS
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text search index of items"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for statement in SQLITE_INDEX_STATEMENTS:
+            schema_editor.execute(statement)
+        # index the items that already exist
+        schema_editor.execute(
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')"
+        )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX api_item_search_idx ON api_item USING GIN ({POSTGRES_VECTOR})"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    """Drop the full-text search index of items"""
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for suffix in ("insert", "delete", "update"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS api_item_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_item_end_date_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
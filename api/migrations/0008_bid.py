@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_bids(apps, schema_editor):
+    """Record the current highest bid of every item as its first bid"""
+    Item = apps.get_model("api", "Item")
+    Bid = apps.get_model("api", "Bid")
+    Bid.objects.bulk_create(
+        Bid(item_id=item.id, user_id=item.bid_user_id, amount=item.bid_price)
+        for item in Item.objects.filter(
+            bid_price__isnull=False, bid_user__isnull=False
+        ).only("id", "bid_user_id", "bid_price")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("api", "0007_item_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Bid",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=32)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bids",
+                        to="api.item",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bids",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["item", "-amount"], name="bid_item_amount_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_bids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_bid"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="itemquery",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                fields=["updated_at", "id"], name="item_updated_at_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="itemquery",
+            index=models.Index(
+                fields=["updated_at", "id"], name="query_updated_at_id_idx"
+            ),
+        ),
+    ]
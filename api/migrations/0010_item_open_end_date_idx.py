@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(
+                condition=models.Q(("mail_sent", False)),
+                fields=["end_date"],
+                name="item_open_end_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_item_open_end_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="lease_expires",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="lease_owner",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
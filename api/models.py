@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import models
+from django.utils import timezone
 from userauth.models import User
 from datetime import datetime
 import pytz
@@ -22,6 +23,25 @@ class Item(models.Model):
     )
     end_date = models.DateTimeField()
     mail_sent = models.BooleanField(default=False)
+    # bulk updates must set this themselves, auto_now only applies to save()
+    updated_at = models.DateTimeField(auto_now=True)
+    # worker closing the auction of this item, and until when (see api.jobs)
+    lease_owner = models.CharField(max_length=64, blank=True, editable=False)
+    lease_expires = models.DateTimeField(blank=True, null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # used by the keyset pagination of the item list
+            models.Index(fields=["end_date", "id"], name="item_end_date_id_idx"),
+            # used by the delta sync of changed items
+            models.Index(fields=["updated_at", "id"], name="item_updated_at_id_idx"),
+            # used to find auctions that are due to be closed
+            models.Index(
+                fields=["end_date"],
+                condition=models.Q(mail_sent=False),
+                name="item_open_end_date_idx",
+            ),
+        ]
 
     def to_dict(self):
         """Convert an item to a JSON-serializable dictionary"""
@@ -75,6 +95,13 @@ class ItemQuery(models.Model):
         on_delete=models.CASCADE,
         related_name="queries",
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # used by the delta sync of changed queries
+            models.Index(fields=["updated_at", "id"], name="query_updated_at_id_idx"),
+        ]
 
     def to_dict(self):
         """Convert a query to a JSON-serializable dictionary"""
@@ -84,3 +111,57 @@ class ItemQuery(models.Model):
             "asked_by": self.asked_by.to_dict(),
             "answer": self.answer,
         }
+
+
+class Bid(models.Model):
+    """This represent a bid placed on an item. Bids are only ever inserted, the
+    highest one is also cached in Item.bid_price and Item.bid_user"""
+
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="bids")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="bids")
+    amount = models.DecimalField(decimal_places=2, max_digits=32)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # highest bids of an item first
+            models.Index(fields=["item", "-amount"], name="bid_item_amount_idx"),
+        ]
+
+    def to_dict(self):
+        """Convert a bid to a JSON-serializable dictionary"""
+        return {
+            "id": self.id,
+            "user": self.user.to_dict(),
+            "amount": self.amount,
+            "created_at": self.created_at,
+        }
+
+
+class Outbox(models.Model):
+    """This represent an email waiting to be sent by the outbox worker"""
+
+    # idempotency key, an email is only queued once per key
+    key = models.CharField(max_length=200, unique=True)
+    subject = models.TextField()
+    message = models.TextField()
+    email = models.EmailField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    # failed attempts so far, and when the email is due to be tried (again)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # worker sending this email, which holds it until next_attempt_at
+    lease_owner = models.CharField(max_length=64, blank=True)
+
+    class Meta:
+        indexes = [
+            # used by workers to find the emails due to be sent
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="outbox_pending_idx",
+            ),
+        ]
@@ -0,0 +1,121 @@
+import logging
+import time
+from datetime import timedelta
+from typing import List, Tuple
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api import mailer
+from api.models import Outbox
+
+logger = logging.getLogger(__name__)
+
+# number of emails claimed by a worker at a time
+BATCH_SIZE = 100
+# how long a worker may hold emails before other workers can claim them
+LEASE_DURATION = timedelta(minutes=5)
+# emails are given up on after this many failed attempts
+MAX_ATTEMPTS = 10
+# delay before the first retry, doubled after every failed attempt
+BACKOFF_BASE = timedelta(seconds=30)
+BACKOFF_MAX = timedelta(hours=1)
+
+
+def backoff(attempts: int) -> timedelta:
+    """Return the delay before retrying an email that failed `attempts` times"""
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim_emails(worker: str, batch_size: int = BATCH_SIZE) -> List[Outbox]:
+    """Lease a batch of emails due to be sent to a worker, and return them.
+
+    Works like api.jobs.check_item_completion.claim_ended_items: the lease is
+    taken by a conditional UPDATE, after skipping rows locked by other workers
+    on databases that support it.
+    """
+    now = timezone.now()
+    lease_expires = now + LEASE_DURATION
+    due = Outbox.objects.filter(
+        sent_at__isnull=True, next_attempt_at__lte=now, attempts__lt=MAX_ATTEMPTS
+    ).order_by("next_attempt_at")
+
+    def take_lease(ids: List[int]):
+        Outbox.objects.filter(
+            id__in=ids, sent_at__isnull=True, next_attempt_at__lte=now
+        ).update(lease_owner=worker, next_attempt_at=lease_expires)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                due.select_for_update(skip_locked=True).values_list("id", flat=True)[
+                    :batch_size
+                ]
+            )
+            take_lease(ids)
+    else:
+        ids = list(due.values_list("id", flat=True)[:batch_size])
+        take_lease(ids)
+
+    return list(
+        Outbox.objects.filter(
+            id__in=ids,
+            lease_owner=worker,
+            sent_at__isnull=True,
+            next_attempt_at=lease_expires,
+        )
+    )
+
+
+def deliver(emails: List[Outbox], worker: str) -> Tuple[int, int]:
+    """Send leased emails in one batch, and record the outcome of each of them.
+
+    Failed emails are retried with an exponential backoff. Returns how many
+    emails were sent and how many failed.
+    """
+    errors = mailer.send_batch(
+        [mailer.build_mail(e.subject, e.message, e.email, key=e.key) for e in emails]
+    )
+    now = timezone.now()
+
+    sent = [e.id for e, error in zip(emails, errors) if error is None]
+    Outbox.objects.filter(id__in=sent, lease_owner=worker).update(
+        sent_at=now, lease_owner=""
+    )
+
+    failed = [(e, error) for e, error in zip(emails, errors) if error is not None]
+    for email, error in failed:
+        logger.warning("Failed to send email %s: %s", email.key, error)
+        Outbox.objects.filter(id=email.id, lease_owner=worker).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + backoff(email.attempts + 1),
+            last_error=str(error),
+            lease_owner="",
+        )
+    return len(sent), len(failed)
+
+
+def process_outbox(worker: str, batch_size: int = BATCH_SIZE) -> int:
+    """Send the emails due to be sent until there are none left, and return how
+    many were sent"""
+    total = 0
+    while True:
+        emails = claim_emails(worker, batch_size)
+        if not emails:
+            return total
+        sent, _ = deliver(emails, worker)
+        total += sent
+
+
+def run_forever(worker: str, poll_interval: float = 1.0, batch_size: int = BATCH_SIZE):
+    """Send queued emails as they come in, until interrupted"""
+    while True:
+        try:
+            close_old_connections()
+            sent = process_outbox(worker, batch_size)
+            if sent:
+                logger.info("Sent %d emails", sent)
+        except Exception:
+            logger.exception("Failed to process the outbox")
+        time.sleep(poll_interval)
@@ -0,0 +1,168 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import DateTimeField, Q, QuerySet
+from django.http import HttpRequest
+from django.utils import timezone
+
+# number of items returned when the client doesn't ask for a specific amount
+DEFAULT_LIMIT = 50
+# upper bound of items per page, so a single request can't dump the whole table
+MAX_LIMIT = 200
+# changes saved this long before a poll are fetched again by the next one, in
+# case their transaction committed after the poll ran
+CHANGES_OVERLAP = timedelta(seconds=5)
+
+
+class InvalidPageRequest(ValueError):
+    """Raised when the limit or cursor parameters of a request are malformed"""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode a list of JSON-serializable values into an opaque cursor string"""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Decode a cursor string created by encode_cursor"""
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError as e:
+        raise InvalidPageRequest("Invalid cursor") from e
+
+    if not isinstance(values, list):
+        raise InvalidPageRequest("Invalid cursor")
+    return values
+
+
+def parse_limit(request: HttpRequest) -> int:
+    """Return the page size requested with the `limit` parameter"""
+    limit = request.GET.get("limit", None)
+    if not limit:
+        return DEFAULT_LIMIT
+
+    try:
+        limit = int(limit)
+    except ValueError as e:
+        raise InvalidPageRequest("Limit must be an integer") from e
+
+    if limit < 1:
+        raise InvalidPageRequest("Limit must be a positive integer")
+    return min(limit, MAX_LIMIT)
+
+
+def cursor_value(value: Any) -> Any:
+    """Convert a field value into something JSON-serializable for a cursor"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def seek(
+    items: QuerySet,
+    position: Optional[List[Any]],
+    limit: int,
+    ordering: Sequence[str],
+) -> Tuple[list, bool]:
+    """Return up to `limit` items following a position, and whether more follow.
+
+    The position holds the ordering values of an item as stored in a cursor, or
+    None to start from the beginning. The ordering must be unique, and should be
+    covered by an index so that seeking is an index range scan.
+    """
+    items = items.order_by(*ordering)
+    names = [o.lstrip("-") for o in ordering]
+
+    if position is not None:
+        if len(position) != len(ordering) or None in position:
+            raise InvalidPageRequest("Invalid cursor")
+        try:
+            values = [
+                items.model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, position)
+            ]
+        except (ValidationError, TypeError) as e:
+            raise InvalidPageRequest("Invalid cursor") from e
+
+        # (a > x) OR (a = x AND b > y) OR ..., with < for descending fields
+        after = Q(pk__in=[])
+        for i, o in enumerate(ordering):
+            lookup = "lt" if o.startswith("-") else "gt"
+            equal = {name: value for name, value in zip(names[:i], values[:i])}
+            after |= Q(**equal, **{f"{names[i]}__{lookup}": values[i]})
+        items = items.filter(after)
+
+    # fetch one extra row to find out whether more items follow
+    page = list(items[: limit + 1])
+    return page[:limit], len(page) > limit
+
+
+def position_of(item: Any, ordering: Sequence[str]) -> List[Any]:
+    """Return the position of an item for seek, as stored in a cursor"""
+    return [cursor_value(getattr(item, o.lstrip("-"))) for o in ordering]
+
+
+def rewind(position: Optional[List[Any]], horizon: datetime) -> Optional[List[Any]]:
+    """Move an (updated_at, id) position back to a horizon if it is past it.
+
+    updated_at is set before a transaction commits, so rows can become visible
+    behind a position that was already handed out. Polling again from the
+    horizon returns such rows, along with some that were already returned.
+    """
+    if position is None:
+        return position
+    # validated by seek, but it may come from a client as a naive or date-only
+    # value, which the database reads in the current time zone
+    updated_at = DateTimeField().to_python(position[0])
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at)
+    if updated_at <= horizon:
+        return position
+    return [cursor_value(horizon), 0]
+
+
+def keyset_page(
+    items: QuerySet,
+    cursor: Optional[str],
+    limit: int,
+    ordering: Sequence[str] = ("end_date", "id"),
+) -> Tuple[list, Optional[str]]:
+    """Return one page of items, and the cursor of the next page.
+
+    The cursor holds the position of the last item on the previous page, so
+    fetching any page costs the same no matter how deep into the table it is.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    page, has_more = seek(items, position, limit, ordering)
+    if not has_more:
+        return page, None
+    return page, encode_cursor(position_of(page[-1], ordering))
+
+
+def offset_page(
+    items: QuerySet, cursor: Optional[str], limit: int
+) -> Tuple[list, Optional[str]]:
+    """Return one page of an already-ordered queryset, and the cursor of the next page.
+
+    Used where the ordering has no stable key to seek on, such as search relevance.
+    """
+    offset = 0
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise InvalidPageRequest("Invalid cursor")
+        offset = values[0]
+
+    page = list(items[offset : offset + limit + 1])
+    if len(page) <= limit:
+        return page, None
+
+    return page[:limit], encode_cursor([offset + limit])
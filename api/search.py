@@ -0,0 +1,122 @@
+import re
+from typing import List
+
+from django.db import connection, connections
+from django.db.models import BooleanField, FloatField, Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+# SQLite FTS5 table indexing the title and description of items, kept in sync
+# with api_item by triggers (see migration 0007_item_search_index)
+SQLITE_FTS_TABLE = "api_item_fts"
+
+# PostgreSQL expression covered by the GIN index of migration 0007_item_search_index.
+# Queries must use exactly this expression for the index to be picked.
+POSTGRES_VECTOR = (
+    "to_tsvector('english', coalesce(\"api_item\".\"title\", '') || ' ' || "
+    'coalesce("api_item"."desc", \'\'))'
+)
+
+
+SQLITE_INDEX_STATEMENTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, "desc", content='api_item', content_rowid='id'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_insert AFTER INSERT ON api_item BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, "desc")
+        VALUES (new.id, new.title, new."desc");
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_delete AFTER DELETE ON api_item BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, "desc")
+        VALUES ('delete', old.id, old.title, old."desc");
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_update
+    AFTER UPDATE OF title, "desc" ON api_item BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, "desc")
+        VALUES ('delete', old.id, old.title, old."desc");
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, "desc")
+        VALUES (new.id, new.title, new."desc");
+    END
+    """,
+]
+
+
+def ensure_search_index(using: str = "default", **kwargs):
+    """Create the SQLite full-text index and its triggers if they are missing.
+
+    SQLite migrations that alter api_item rebuild the table, which drops its
+    triggers, so this runs after every migrate (see ApiConfig.ready).
+    """
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+
+    with conn.cursor() as cursor:
+        if SQLITE_FTS_TABLE not in conn.introspection.table_names(cursor):
+            return
+        for statement in SQLITE_INDEX_STATEMENTS[1:]:
+            cursor.execute(statement)
+
+
+def search_terms(search: str) -> List[str]:
+    """Split a search into words, dropping anything that isn't a letter or digit.
+
+    This keeps user input from being interpreted as FTS query syntax.
+    """
+    return re.findall(r"\w+", search.lower())
+
+
+def search_items(items: QuerySet, search: str) -> QuerySet:
+    """Filter items matching a search, ordered by relevance (best match first).
+
+    Uses the full-text index of the current database when it has one, and falls
+    back to a substring match on databases that don't.
+    """
+    terms = search_terms(search)
+
+    if terms and connection.vendor == "sqlite":
+        # every term must match, each as a prefix to support search-as-you-type
+        query = " ".join(f'"{t}"*' for t in terms)
+        # bm25 ranks lower values as more relevant, matches in the title weigh more
+        items = items.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s",
+                [query],
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT bm25({SQLITE_FTS_TABLE}, 10.0, 1.0) FROM {SQLITE_FTS_TABLE} "
+                f"WHERE {SQLITE_FTS_TABLE} MATCH %s "
+                f'AND {SQLITE_FTS_TABLE}.rowid = "api_item"."id"',
+                [query],
+                output_field=FloatField(),
+            )
+        )
+        return items.order_by("search_rank", "id")
+
+    if terms and connection.vendor == "postgresql":
+        query = " & ".join(f"{t}:*" for t in terms)
+        items = items.filter(
+            RawSQL(
+                f"{POSTGRES_VECTOR} @@ to_tsquery('english', %s)",
+                [query],
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            # negated so that lower values are more relevant, like bm25
+            search_rank=RawSQL(
+                f"-ts_rank({POSTGRES_VECTOR}, to_tsquery('english', %s))",
+                [query],
+                output_field=FloatField(),
+            )
+        )
+        return items.order_by("search_rank", "id")
+
+    items = items.filter(Q(title__icontains=search) | Q(desc__icontains=search))
+    return items.order_by("end_date", "id")
@@ -0,0 +1,203 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.db.models import Model
+
+# bump when the dictionaries models are serialized to change shape, so that
+# entries cached by older code are never read
+SCHEMA_VERSION = 1
+
+Key = Tuple[str, Hashable, int, int, Hashable]
+
+
+class SerializationCache:
+    """LRU cache of the dictionaries models are serialized to, keyed by
+    (model, pk, version, revision).
+
+    Entries are kept in process memory, up to max_size of them. Invalidating an
+    object bumps its version, so entries built from older data are never read
+    again, even by requests that were building them at the time.
+
+    Versions are only bumped in the process that saved the object, unless the
+    backend is shared. Callers that already read the revision of the row, its
+    updated_at, pass it along so that entries of other revisions are never
+    returned to them, whichever process saved the row. Values read from a
+    read replica without a revision are not cached, as the replica may lag
+    behind the invalidations.
+
+    With a shared backend, the name of a Django cache, entries and versions are
+    also stored there so that every worker sees invalidations. Versions read
+    from it are trusted for version_ttl seconds, which bounds how long other
+    workers can serve stale entries.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        timeout: float = 300,
+        backend: Optional[str] = None,
+        version_ttl: float = 1.0,
+    ):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.backend = caches[backend] if backend else None
+        self.version_ttl = version_ttl
+
+        self._lock = threading.Lock()
+        # key -> (expiry timestamp, value), least recently used first
+        self._entries: "OrderedDict[Key, Tuple[float, Any]]" = OrderedDict()
+        # (model, pk) -> (version, timestamp the version was read at)
+        self._versions: "OrderedDict[Tuple[str, Hashable], Tuple[int, float]]" = (
+            OrderedDict()
+        )
+        # fresh local versions, never reused so that entries of an object whose
+        # version was evicted can't become readable again
+        self._next_version = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _backend_key(*parts: Any) -> str:
+        return "serialization:" + ":".join(str(p) for p in parts)
+
+    def _version(self, label: str, pk: Hashable, now: float) -> int:
+        """Return the current version of an object"""
+        with self._lock:
+            cached = self._versions.get((label, pk))
+        if cached is not None and (
+            self.backend is None or now - cached[1] < self.version_ttl
+        ):
+            return cached[0]
+        if self.backend is None:
+            return 0
+
+        version = self.backend.get(self._backend_key("version", label, pk), 0)
+        self._remember_version(label, pk, version, now)
+        return version
+
+    def _remember_version(self, label: str, pk: Hashable, version: int, now: float):
+        with self._lock:
+            self._versions[(label, pk)] = (version, now)
+            self._versions.move_to_end((label, pk))
+            while len(self._versions) > self.max_size:
+                self._versions.popitem(last=False)
+
+    def _store(self, key: Key, expires: float, value: Any):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_build(
+        self,
+        model: Type[Model],
+        pk: Hashable,
+        build: Callable[[], Any],
+        expires_at: Optional[Callable[[Any], Optional[datetime]]] = None,
+        revision: Hashable = None,
+    ) -> Any:
+        """Return the cached value of an object, or build and cache it.
+
+        The value is shared between callers and must not be modified. If given,
+        expires_at returns when a freshly built value stops being valid, for
+        values that depend on the current time, and revision identifies the
+        row the value must be built from, which build must then serialize.
+        """
+        now = time.time()
+        label = model._meta.label_lower
+        key = (label, pk, SCHEMA_VERSION, self._version(label, pk, now), revision)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        if self.backend is not None:
+            entry = self.backend.get(self._backend_key(*key))
+            if entry is not None and entry[0] > now:
+                self._store(key, *entry)
+                with self._lock:
+                    self.hits += 1
+                return entry[1]
+
+        with self._lock:
+            self.misses += 1
+        value = build()
+        if revision is None and router.db_for_read(model) != DEFAULT_DB_ALIAS:
+            # a replica can still serve the rows an invalidation was for, a
+            # value built from them is only cached under their revision
+            return value
+
+        expires = now + self.timeout
+        until = expires_at(value) if expires_at is not None else None
+        if until is not None:
+            expires = min(expires, until.timestamp())
+        if expires > now:
+            # stored under the version read before building, so a value built
+            # while the object was being invalidated is never read
+            self._store(key, expires, value)
+            if self.backend is not None:
+                self.backend.set(
+                    self._backend_key(*key), (expires, value), expires - now
+                )
+        return value
+
+    def invalidate(self, model: Type[Model], pk: Hashable):
+        """Make every cached value of an object stale"""
+        now = time.time()
+        label = model._meta.label_lower
+        with self._lock:
+            # drop the current entry, in case its version is evicted later on
+            previous = self._versions.get((label, pk), (0, now))[0]
+            self._entries.pop((label, pk, SCHEMA_VERSION, previous, None), None)
+        if self.backend is None:
+            with self._lock:
+                version = next(self._next_version)
+        else:
+            version_key = self._backend_key("version", label, pk)
+            self.backend.add(version_key, 0, None)
+            version = self.backend.incr(version_key)
+        self._remember_version(label, pk, version, now)
+
+    def clear(self):
+        """Drop every entry held in process memory"""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit and miss counters, and the number of local entries"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+@lru_cache(maxsize=None)
+def get_serialization_cache() -> SerializationCache:
+    """Return the cache configured by the SERIALIZATION_CACHE setting"""
+    return SerializationCache(**settings.SERIALIZATION_CACHE)
+
+
+def invalidate(model: Type[Model], pk: Hashable):
+    """Invalidate the cached values of an object once the current transaction
+    commits, so that no request caches the data being replaced in between"""
+    transaction.on_commit(lambda: get_serialization_cache().invalidate(model, pk))
+
+
+def invalidate_instance(sender: Type[Model], instance: Model, **kwargs):
+    """Signal receiver invalidating saved and deleted objects"""
+    invalidate(sender, instance.pk)
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+import pytz
+from django.core.files.storage import default_storage
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+from .encoders import encode
+
+# number of rows fetched from the database at a time
+CHUNK_SIZE = 500
+# amount of encoded JSON buffered before it is sent to the client
+BUFFER_SIZE = 64 * 1024
+
+USER_FIELDS = ["id", "email", "dob", "avatar"]
+
+ITEM_FIELDS = [
+    "id",
+    "title",
+    "desc",
+    "photo",
+    "starting_price",
+    "bid_price",
+    "end_date",
+    "mail_sent",
+    *[f"owner__{f}" for f in USER_FIELDS],
+    *[f"bid_user__{f}" for f in USER_FIELDS],
+]
+
+QUERY_FIELDS = [
+    "id",
+    "question",
+    "answer",
+    *[f"asked_by__{f}" for f in USER_FIELDS],
+]
+
+
+def file_url(name: Optional[str]) -> Optional[str]:
+    """Return the URL of a stored file, like FieldFile.url does"""
+    return default_storage.url(name) if name else None
+
+
+def user_row_to_dict(row: Dict[str, Any], prefix: str) -> Optional[Dict[str, Any]]:
+    """Convert the user columns of a values() row, like User.to_dict does"""
+    if row[f"{prefix}id"] is None:
+        return None
+
+    return {
+        "id": row[f"{prefix}id"],
+        "email": row[f"{prefix}email"],
+        "dob": row[f"{prefix}dob"],
+        "avatar_path": file_url(row[f"{prefix}avatar"]),
+    }
+
+
+def item_row_to_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a values() row of ITEM_FIELDS, like Item.to_dict does"""
+    starting_price = row["starting_price"]
+    bid_price = row["bid_price"]
+
+    if not bid_price or starting_price > bid_price:
+        current_price = starting_price
+    else:
+        current_price = bid_price
+
+    return {
+        "id": row["id"],
+        "owner": user_row_to_dict(row, "owner__"),
+        "title": row["title"],
+        "desc": row["desc"],
+        "photo_path": file_url(row["photo"]),
+        "starting_price": starting_price,
+        "bid_price": bid_price,
+        "bid_user": user_row_to_dict(row, "bid_user__"),
+        "end_date": row["end_date"],
+        "current_price": current_price,
+        "has_bids": bid_price is not None,
+        "has_ended": row["end_date"] < datetime.now(pytz.UTC) or row["mail_sent"],
+    }
+
+
+def query_row_to_dict(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a values() row of QUERY_FIELDS, like ItemQuery.to_dict does"""
+    return {
+        "id": row["id"],
+        "question": row["question"],
+        "asked_by": user_row_to_dict(row, "asked_by__"),
+        "answer": row["answer"],
+    }
+
+
+def encode_list(
+    rows: Iterable[Dict[str, Any]], to_dict: Callable[[Dict[str, Any]], Any]
+) -> Iterator[bytes]:
+    """Encode a successful API response item by item, with the rows as its value.
+
+    The output is the same as json_response gives for the whole list at once.
+    """
+    buffer = [b'{"status":"OK","value":[']
+    buffered = 0
+    separator = b""
+
+    for row in rows:
+        encoded = separator + encode(to_dict(row))
+        separator = b","
+        buffer.append(encoded)
+        buffered += len(encoded)
+
+        if buffered >= BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+
+    buffer.append(b"]}")
+    yield b"".join(buffer)
+
+
+def stream_items(items: QuerySet) -> StreamingHttpResponse:
+    """Stream a list of items as JSON without loading them all in memory"""
+    rows = items.values(*ITEM_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(
+        encode_list(rows, item_row_to_dict), content_type="application/json"
+    )
+
+
+def stream_objects(
+    objects: QuerySet, to_dict: Callable[[Any], Any]
+) -> StreamingHttpResponse:
+    """Stream a list of model instances as JSON, converted by to_dict.
+
+    Slower than streaming values() rows, for listings that load few columns.
+    """
+    rows = objects.iterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(
+        encode_list(rows, to_dict), content_type="application/json"
+    )
+
+
+def stream_queries(queries: QuerySet) -> StreamingHttpResponse:
+    """Stream a list of item queries as JSON without loading them all in memory"""
+    rows = queries.values(*QUERY_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    return StreamingHttpResponse(
+        encode_list(rows, query_row_to_dict), content_type="application/json"
+    )
@@ -6,9 +6,13 @@ from . import views
 
 app_name = "api"
 urlpatterns = [
+    path("batch/", views.batch, name="batch"),
     path("items/", views.list_items, name="items"),
+    path("items/changes/", views.list_item_changes, name="item_changes"),
     path("items/<int:item_id>/", views.show_item, name="item"),
     path("items/<int:item_id>/bid/", views.bid_item, name="bid_item"),
+    path("items/<int:item_id>/bids/", views.list_item_bids, name="item_bids"),
+    path("items/<int:item_id>/events/", views.item_events, name="item_events"),
     path("items/<int:item_id>/queries/", views.list_item_queries, name="item_queries"),
     path(
         "items/<int:item_id>/queries/<int:query_id>/",
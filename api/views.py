@@ -1,16 +1,58 @@
+import json
 from functools import wraps
 from typing import Callable, TypeVar
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model, login
-from django.db.models import Q
-from django.http import HttpRequest, JsonResponse, QueryDict
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    HttpRequest,
+    HttpResponseNotAllowed,
+    QueryDict,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import etag, require_http_methods
 
 from userauth.models import User
 
+from .batch import InvalidBatchRequest, run_batch
+from .bidding import BidRejected, place_bid
+from .encoders import json_response
+from .etags import item_etag, item_queries_etag, profile_etag
+from .fieldsets import (
+    DEFAULT_ITEM_FIELDSET,
+    ITEM_FIELDS,
+    ITEM_RELATIONS,
+    USER_FIELDS,
+    InvalidFieldset,
+    fieldset_dict,
+    fieldset_queryset,
+    item_dict,
+    parse_fieldset,
+    project_dict,
+    query_dict,
+    user_dict,
+)
+from .events import event_stream, item_channel, publish_item_event
 from .forms import BidForm, ItemForm, QueryAnswerForm, QueryQuestionForm, UserForm
-from .models import Item, ItemQuery
+from .models import Bid, Item, ItemQuery
+from .pagination import (
+    CHANGES_OVERLAP,
+    InvalidPageRequest,
+    decode_cursor,
+    encode_cursor,
+    keyset_page,
+    offset_page,
+    parse_limit,
+    position_of,
+    rewind,
+    seek,
+)
+from .search import search_items
+from .streaming import stream_items, stream_objects, stream_queries
 
 TCallable = TypeVar("TCallable", bound=Callable)
 
@@ -21,7 +63,7 @@ def require_login(func: TCallable) -> TCallable:
     @wraps(func)
     def wrapped(request: HttpRequest, *args, **kwargs):
         if not request.user.is_authenticated:
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "You must be authenticated to perform this action.",
@@ -33,7 +75,13 @@ def require_login(func: TCallable) -> TCallable:
     return wrapped
 
 
+def wants_stream(request: HttpRequest) -> bool:
+    """Return whether the client asked for a streamed response with `stream=1`"""
+    return request.GET.get("stream", "").lower() in ("1", "true")
+
+
 @require_http_methods(["GET", "PUT"])
+@etag(profile_etag)
 @csrf_exempt
 def profile(request: HttpRequest):
     """Return/Update information about the currently-logged-in user, or None if not logged in."""
@@ -41,12 +89,12 @@ def profile(request: HttpRequest):
 
     if request.method == "GET":
         if request.user.is_authenticated:
-            return JsonResponse({"status": "OK", "value": user.to_dict()})
+            return json_response({"status": "OK", "value": user.to_dict()})
         else:
-            return JsonResponse({"status": "OK", "value": None})
+            return json_response({"status": "OK", "value": None})
     else:
         if not request.user.is_authenticated:
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "You must be authenticated to perform this action.",
@@ -64,10 +112,10 @@ def profile(request: HttpRequest):
             user.save()
 
             login(request, user)
-            return JsonResponse({"status": "OK"})
+            return json_response({"status": "OK"})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to save changes to user",
@@ -86,13 +134,20 @@ def show_user(request: HttpRequest, user_id: int):
 
     if request.method == "GET":
         # GET any user
-        user: User = get_user_model().objects.get(id=user_id)
-
-        return JsonResponse({"status": "OK", "value": user.to_dict()})
+        try:
+            fieldset = parse_fieldset(request, USER_FIELDS)
+        except InvalidFieldset as e:
+            return json_response(
+                {"status": "FAILED", "message": str(e)},
+                status=400,  # bad request
+            )
+        # served from the serialization cache when the user was shown recently
+        value = project_dict(user_dict(user_id), fieldset)
+        return json_response({"status": "OK", "value": value})
     else:
         # PUT, only allow editing the own user
         if not is_own_user:
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "You can only edit your own user profile",
@@ -105,10 +160,10 @@ def show_user(request: HttpRequest, user_id: int):
 
         if form.is_valid():
             form.save()
-            return JsonResponse({"status": "OK"})
+            return json_response({"status": "OK"})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to save changes to user",
@@ -125,14 +180,51 @@ def list_items(request: HttpRequest):
     """Show or search list of all items, or create a new item"""
     if request.method == "GET":
         search = request.GET.get("q", None)
-        if search:
-            items = Item.objects.filter(
-                Q(title__icontains=search) | Q(desc__icontains=search)
+        try:
+            fieldset = parse_fieldset(request, ITEM_FIELDS, ITEM_RELATIONS)
+        except InvalidFieldset as e:
+            return json_response(
+                {"status": "FAILED", "message": str(e)},
+                status=400,  # bad request
+            )
+        # only load the requested columns, and the ones used by the pagination.
+        # Owners and bidders are fetched in the same query as the items
+        items = fieldset_queryset(Item.objects.all(), fieldset, ("end_date", "id"))
+
+        if wants_stream(request):
+            # stream the whole listing instead of a single page
+            if search:
+                items = search_items(items, search)
+            else:
+                items = items.order_by("end_date", "id")
+            if fieldset == DEFAULT_ITEM_FIELDSET:
+                return stream_items(items)
+            return stream_objects(items, lambda i: fieldset_dict(i, fieldset))
+
+        try:
+            limit = parse_limit(request)
+            cursor = request.GET.get("cursor")
+            if search:
+                # search results are ordered by relevance instead of end date
+                page, next_cursor = offset_page(
+                    search_items(items, search), cursor, limit
+                )
+            else:
+                page, next_cursor = keyset_page(items, cursor, limit)
+        except InvalidPageRequest as e:
+            return json_response(
+                {"status": "FAILED", "message": str(e)},
+                status=400,  # bad request
             )
-        else:
-            items = Item.objects.all()
 
-        return JsonResponse({"status": "OK", "value": [i.to_dict() for i in items]})
+        return json_response(
+            {
+                "status": "OK",
+                "value": [fieldset_dict(i, fieldset) for i in page],
+                # cursor to pass back for the next page, None on the last page
+                "next_cursor": next_cursor,
+            }
+        )
     else:
         item_params = request.POST.copy()
         item_params["owner"] = request.user
@@ -140,10 +232,10 @@ def list_items(request: HttpRequest):
         form = ItemForm(item_params, request.FILES)
         if form.is_valid():
             item: Item = form.save()
-            return JsonResponse({"status": "OK", "value": item.to_dict()})
+            return json_response({"status": "OK", "value": item.to_dict()})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to create the item",
@@ -153,22 +245,96 @@ def list_items(request: HttpRequest):
             )
 
 
+@require_http_methods(["GET"])
+@require_login
+@csrf_exempt
+def list_item_changes(request: HttpRequest):
+    """Show the items and queries changed since a cursor, and the cursor to poll next.
+
+    Without a cursor every item and query is returned, in pages of `limit` rows of
+    each. `has_more` is true while there are changes left to fetch. Changes made in
+    the last CHANGES_OVERLAP may be returned again by the next poll, so clients
+    apply them by id.
+    """
+    ordering = ("updated_at", "id")
+    try:
+        limit = parse_limit(request)
+        since = request.GET.get("since", None)
+        positions = decode_cursor(since) if since else [None, None]
+        if len(positions) != 2:
+            raise InvalidPageRequest("Invalid cursor")
+
+        items, more_items = seek(
+            Item.objects.select_related("owner", "bid_user"),
+            positions[0],
+            limit,
+            ordering,
+        )
+        queries, more_queries = seek(
+            ItemQuery.objects.select_related("asked_by"),
+            positions[1],
+            limit,
+            ordering,
+        )
+    except InvalidPageRequest as e:
+        return json_response(
+            {"status": "FAILED", "message": str(e)},
+            status=400,  # bad request
+        )
+
+    # resume after the last row of each table, or where the previous poll stopped
+    if items:
+        positions[0] = position_of(items[-1], ordering)
+    if queries:
+        positions[1] = position_of(queries[-1], ordering)
+    # once caught up, the next poll fetches the last changes again, in case
+    # older ones commit meanwhile
+    horizon = timezone.now() - CHANGES_OVERLAP
+    if not more_items:
+        positions[0] = rewind(positions[0], horizon)
+    if not more_queries:
+        positions[1] = rewind(positions[1], horizon)
+
+    return json_response(
+        {
+            "status": "OK",
+            "value": {
+                "items": [i.to_dict() for i in items],
+                "queries": [{**q.to_dict(), "item_id": q.item_id} for q in queries],
+            },
+            "next_cursor": encode_cursor(positions),
+            "has_more": more_items or more_queries,
+        }
+    )
+
+
 @require_http_methods(["GET", "PUT"])
 @require_login
+@etag(item_etag)
 @csrf_exempt
 def show_item(request: HttpRequest, item_id: int):
     """Show/update one item"""
-    item = Item.objects.get(id=item_id)
-    is_own_item = item.owner == request.user
-
     if request.method == "GET":
         # GET any item
-        return JsonResponse({"status": "OK", "value": item.to_dict()})
+        try:
+            fieldset = parse_fieldset(request, ITEM_FIELDS, ITEM_RELATIONS)
+        except InvalidFieldset as e:
+            return json_response(
+                {"status": "FAILED", "message": str(e)},
+                status=400,  # bad request
+            )
+        # served from the serialization cache when the item was shown recently,
+        # at the revisions item_etag read
+        revisions = getattr(request, "item_revisions", None)
+        value = project_dict(item_dict(item_id, revisions=revisions), fieldset)
+        return json_response({"status": "OK", "value": value})
     else:
         # PUT, only allow editing own items
+        item = Item.objects.get(id=item_id)
+        is_own_item = item.owner == request.user
         if not is_own_item:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "You can only edit your own items",
@@ -184,10 +350,10 @@ def show_item(request: HttpRequest, item_id: int):
         if form.is_valid():
             form.save()
             item.refresh_from_db()
-            return JsonResponse({"status": "OK", "value": item.to_dict()})
+            return json_response({"status": "OK", "value": item.to_dict()})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to update the item",
@@ -202,34 +368,25 @@ def show_item(request: HttpRequest, item_id: int):
 @csrf_exempt
 def bid_item(request: HttpRequest, item_id: int):
     """update one bid item"""
-    item = Item.objects.get(id=item_id)
-    is_own_item = item.owner == request.user
-
-    if is_own_item:
-        return JsonResponse(
-            {"status": "FAILED", "message": "You cannot bid on your own items."},
-            status=401,  # unauthorized
-        )
-
-    if item.has_ended():
-        return JsonResponse(
-            {"status": "FAILED", "message": "Item auction has ended."},
-            status=403,  # forbidden
-        )
-
-    # get parameters in the form of a mutable QueryDict using copy()
-    item_params = request.PUT.copy()
-    # bid user must be the current user
-    item_params["bid_user"] = request.user
+    form = BidForm(request.PUT)
+    if form.is_valid():
+        try:
+            place_bid(item_id, request.user, form.cleaned_data["bid_price"])
+        except BidRejected as e:
+            if not e.field_error:
+                return json_response(
+                    {"status": "FAILED", "message": e.message}, status=e.status
+                )
+            form.add_error("bid_price", e.message)
 
-    form = BidForm(item_params, instance=item)
     if form.is_valid():
-        form.save()
-        item.refresh_from_db()
-        return JsonResponse({"status": "OK", "value": item.to_dict()})
+        item = Item.objects.select_related("owner", "bid_user").get(id=item_id)
+        value = item.to_dict()
+        publish_item_event(item_id, "bid", value)
+        return json_response({"status": "OK", "value": value})
     else:
         errors = form.errors.get_json_data()
-        return JsonResponse(
+        return json_response(
             {
                 "status": "FAILED",
                 "message": "Failed to place bid on the item",
@@ -239,8 +396,88 @@ def bid_item(request: HttpRequest, item_id: int):
         )
 
 
+async def item_events(request: HttpRequest, item_id: int):
+    """Stream new bids and query answers of one item as Server-Sent Events.
+
+    This is an async view, served without tying up a worker thread per client
+    when the project runs through project/asgi.py. Through WSGI, the stream
+    would be buffered until it ends while holding a worker, so clients are
+    told to poll instead.
+    """
+    # Django's method and login decorators don't support async views yet
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    if not isinstance(request, ASGIRequest):
+        return json_response(
+            {
+                "status": "FAILED",
+                "message": "Event streams are only served through ASGI.",
+            },
+            status=501,  # not implemented
+        )
+
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return json_response(
+            {
+                "status": "FAILED",
+                "message": "You must be authenticated to perform this action.",
+            },
+            status=401,  # unauthorized
+        )
+
+    if not await Item.objects.filter(id=item_id).aexists():
+        return json_response(
+            {"status": "FAILED", "message": "Item does not exist."},
+            status=404,  # not found
+        )
+
+    response = StreamingHttpResponse(
+        event_stream(
+            item_channel(item_id),
+            keepalive=settings.EVENT_STREAM_KEEPALIVE,
+            max_age=settings.EVENT_STREAM_MAX_AGE,
+        ),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # ask reverse proxies not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_http_methods(["GET"])
+@require_login
+@csrf_exempt
+def list_item_bids(request: HttpRequest, item_id: int):
+    """show the bids placed on one item, highest first"""
+    item = Item.objects.get(id=item_id)
+    bids = item.bids.select_related("user")
+
+    try:
+        limit = parse_limit(request)
+        page, next_cursor = keyset_page(
+            bids, request.GET.get("cursor"), limit, ordering=("-amount", "-id")
+        )
+    except InvalidPageRequest as e:
+        return json_response(
+            {"status": "FAILED", "message": str(e)},
+            status=400,  # bad request
+        )
+
+    return json_response(
+        {
+            "status": "OK",
+            "value": [b.to_dict() for b in page],
+            "next_cursor": next_cursor,
+        }
+    )
+
+
 @require_http_methods(["GET", "POST"])
 @require_login
+@etag(item_queries_etag)
 @csrf_exempt
 def list_item_queries(request: HttpRequest, item_id: int):
     """show all queries of one item, or create a new query"""
@@ -248,8 +485,12 @@ def list_item_queries(request: HttpRequest, item_id: int):
 
     if request.method == "GET":
         # list all item queries for this item
-        return JsonResponse(
-            {"status": "OK", "value": [q.to_dict() for q in item.queries.all()]}
+        if wants_stream(request):
+            return stream_queries(item.queries.order_by("id"))
+
+        queries = item.queries.select_related("asked_by")
+        return json_response(
+            {"status": "OK", "value": [query_dict(q) for q in queries]}
         )
     else:
         # create an item query for this item
@@ -265,10 +506,10 @@ def list_item_queries(request: HttpRequest, item_id: int):
         form = QueryQuestionForm(query_params)
         if form.is_valid():
             query: ItemQuery = form.save()
-            return JsonResponse({"status": "OK", "value": query.to_dict()})
+            return json_response({"status": "OK", "value": query.to_dict()})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to create an item query",
@@ -287,7 +528,7 @@ def answer_item_query(request: HttpRequest, item_id: int, query_id: int):
     is_own_item = item.owner == request.user
 
     if not is_own_item:
-        return JsonResponse(
+        return json_response(
             {
                 "status": "FAILED",
                 "message": "You can only answer queries on your own items.",
@@ -302,10 +543,12 @@ def answer_item_query(request: HttpRequest, item_id: int, query_id: int):
     if form.is_valid():
         form.save()
         query.refresh_from_db()
-        return JsonResponse({"status": "OK", "value": query.to_dict()})
+        value = query.to_dict()
+        publish_item_event(item_id, "answer", value)
+        return json_response({"status": "OK", "value": value})
     else:
         errors = form.errors.get_json_data()
-        return JsonResponse(
+        return json_response(
             {
                 "status": "FAILED",
                 "message": "Failed to answer the query.",
@@ -326,11 +569,11 @@ def show_item_query(request: HttpRequest, item_id: int, query_id: int):
 
     if request.method == "GET":
         # show a single query
-        return JsonResponse({"status": "OK", "value": query.to_dict()})
+        return json_response({"status": "OK", "value": query.to_dict()})
     else:
         # update a single query
         if not is_own_query:
-            return JsonResponse(
+            return json_response(
                 {"status": "FAILED", "message": "You can only edit your own queries."},
                 status=401,  # unauthorized
             )
@@ -346,10 +589,10 @@ def show_item_query(request: HttpRequest, item_id: int, query_id: int):
         if form.is_valid():
             form.save()
             query.refresh_from_db()
-            return JsonResponse({"status": "OK", "value": query.to_dict()})
+            return json_response({"status": "OK", "value": query.to_dict()})
         else:
             errors = form.errors.get_json_data()
-            return JsonResponse(
+            return json_response(
                 {
                     "status": "FAILED",
                     "message": "Failed to update the query",
@@ -357,3 +600,30 @@ def show_item_query(request: HttpRequest, item_id: int, query_id: int):
                 },
                 status=400,  # bad request
             )
+
+
+@require_http_methods(["POST"])
+@require_login
+@csrf_exempt
+def batch(request: HttpRequest):
+    """Run several API requests at once, and return all their responses.
+
+    The body is a JSON object like {"requests": [{"method": "GET", "path":
+    "/items/1/"}, ...]}, PUT and POST requests also take a "body" object. The
+    value of the response lists the status code and body of each request.
+    """
+    try:
+        params = json.loads(request.body)
+    except ValueError:
+        return json_response(
+            {"status": "FAILED", "message": "Invalid JSON body"},
+            status=400,  # bad request
+        )
+
+    try:
+        return run_batch(request, params)
+    except InvalidBatchRequest as e:
+        return json_response(
+            {"status": "FAILED", "message": str(e)},
+            status=400,  # bad request
+        )
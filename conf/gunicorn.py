@@ -0,0 +1,24 @@
+"""
+You can set APP_CONFIG to point to this file to serve the application with
+gunicorn's default settings, open the database connections of each worker as
+it boots instead of on its first request, and start with empty METRICS_DIR
+metrics.
+"""
+
+import os
+
+bind = "0.0.0.0:{}".format(os.getenv("PORT", "8080"))
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    from project import database
+
+    database.warm_up()
+
+
+def on_starting(server):
+    from project import metrics
+
+    # the metrics of the previous run would be added to the new ones
+    metrics.clear_directory(os.getenv("METRICS_DIR"))
@@ -3,6 +3,10 @@ ASGI config for project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through ASGI (e.g. ``uvicorn project.asgi:application``)
+lets the async event streams of api.views.item_events hold many open
+connections per worker.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -12,5 +16,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
+# connections are closed after each request, Django advises against persistent
+# connections under ASGI, where queries run in threads of their own
+os.environ.setdefault("DATABASE_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -1,14 +1,111 @@
 import os
+import re
 
 from django.conf import settings
-
+from django.core.exceptions import ImproperlyConfigured
 
 engines = {
     "sqlite": "django.db.backends.sqlite3",
-    "postgresql": "django.db.backends.postgresql_psycopg2",
+    "postgresql": "django.db.backends.postgresql",
     "mysql": "django.db.backends.mysql",
 }
 
+# connection poolers the database can be reached through, see pool_options
+POOLS = ("", "pgbouncer", "internal")
+
+
+def env_flag(name: str, default: bool) -> bool:
+    """Return a boolean environment variable, such as 1/0 or true/false"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def statement_timeout_options(engine: str, timeout_ms: int) -> dict:
+    """Return the OPTIONS cancelling statements running longer than timeout_ms"""
+    if not timeout_ms:
+        return {}
+    if engine == engines["postgresql"]:
+        return {"options": f"-c statement_timeout={timeout_ms}"}
+    if engine == engines["mysql"]:
+        return {"init_command": f"SET SESSION max_execution_time={timeout_ms}"}
+    # SQLite has no statement timeout, only the busy timeout set elsewhere
+    return {}
+
+
+def sqlite_pragmas() -> dict:
+    """Return the PRAGMAs run on each new SQLite connection, none at all if
+    DATABASE_SQLITE_TUNING is off"""
+    if not env_flag("DATABASE_SQLITE_TUNING", True):
+        return {}
+    pragmas = {
+        # readers and the writer don't block each other
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        # with WAL, a power loss can undo the last commits but not corrupt
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        # bytes of the file read through memory mapping
+        "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+        # pages cached per connection, or KiB if negative
+        "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-20000"),
+        # milliseconds to wait for a lock before "database is locked"
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+        "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    }
+    for name, value in pragmas.items():
+        if not re.fullmatch(r"-?\w+", value):
+            raise ImproperlyConfigured(f"Invalid value for PRAGMA {name}: {value}")
+    return pragmas
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Signal receiver running the SQLITE_PRAGMAS of a database's settings on
+    its new connections (see ApiConfig.ready)"""
+    pragmas = connection.settings_dict.get("SQLITE_PRAGMAS")
+    if connection.vendor != "sqlite" or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def pool_options(engine: str, pool: str) -> dict:
+    """Return the settings for reaching PostgreSQL through a connection pool.
+
+    With pgbouncer, connections go through a server-side pooler in transaction
+    mode, which can't keep server-side cursors open between transactions, and
+    must list `options` in its ignore_startup_parameters for the statement
+    timeout to be accepted. The internal pool of psycopg 3 needs Django 5.1 or later.
+    """
+    if pool not in POOLS:
+        raise ImproperlyConfigured(f"DATABASE_POOL must be one of {POOLS}")
+    if not pool:
+        return {}
+    if engine != engines["postgresql"]:
+        raise ImproperlyConfigured("DATABASE_POOL requires PostgreSQL")
+
+    if pool == "pgbouncer":
+        return {"DISABLE_SERVER_SIDE_CURSORS": True}
+
+    import django
+
+    if django.VERSION < (5, 1):
+        raise ImproperlyConfigured(
+            "DATABASE_POOL=internal requires Django 5.1 and psycopg 3, "
+            "use persistent connections or DATABASE_POOL=pgbouncer instead"
+        )
+    return {
+        # pooled connections are returned to the pool after each request
+        "CONN_MAX_AGE": 0,
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE", "10")),
+                "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", "10")),
+            }
+        },
+    }
+
 
 def config():
     service_name = os.getenv("DATABASE_SERVICE_NAME", "").upper().replace("-", "_")
@@ -19,11 +116,70 @@ def config():
     name = os.getenv("DATABASE_NAME")
     if not name and engine == engines["sqlite"]:
         name = os.path.join(settings.BASE_DIR, "db.sqlite3")
-    return {
+
+    options = statement_timeout_options(
+        engine, int(os.getenv("DATABASE_STATEMENT_TIMEOUT", "30000"))
+    )
+    connect_timeout = os.getenv("DATABASE_CONNECT_TIMEOUT")
+    if connect_timeout and engine != engines["sqlite"]:
+        options["connect_timeout"] = int(connect_timeout)
+    conn_max_age = os.getenv("DATABASE_CONN_MAX_AGE", "60")
+
+    result = {
         "ENGINE": engine,
         "NAME": name,
         "USER": os.getenv("DATABASE_USER"),
         "PASSWORD": os.getenv("DATABASE_PASSWORD"),
         "HOST": os.getenv("{}_SERVICE_HOST".format(service_name)),
         "PORT": os.getenv("{}_SERVICE_PORT".format(service_name)),
+        # seconds a connection is reused across requests, 0 to close it after
+        # each request, or empty for connections that are never closed. Only
+        # for WSGI, project/asgi.py defaults it to 0
+        "CONN_MAX_AGE": int(conn_max_age) if conn_max_age else None,
+        # reused connections are checked before each request, so that a
+        # database restart costs one reconnection instead of an error
+        "CONN_HEALTH_CHECKS": env_flag("DATABASE_CONN_HEALTH_CHECKS", True),
+        "OPTIONS": options,
     }
+
+    if engine == engines["sqlite"]:
+        result["SQLITE_PRAGMAS"] = sqlite_pragmas()
+
+    pool = pool_options(engine, os.getenv("DATABASE_POOL", ""))
+    result["OPTIONS"].update(pool.pop("OPTIONS", {}))
+    result.update(pool)
+    return result
+
+
+def replica_config():
+    """Return the settings of the read replica, or None if there isn't one.
+
+    The replica uses the same engine and settings as the primary, except for
+    the ones given by the DATABASE_REPLICA_* variables.
+    """
+    service_name = (
+        os.getenv("DATABASE_REPLICA_SERVICE_NAME", "").upper().replace("-", "_")
+    )
+    name = os.getenv("DATABASE_REPLICA_NAME")
+    if not service_name and not name:
+        return None
+
+    result = config()
+    result["NAME"] = name or result["NAME"]
+    result["USER"] = os.getenv("DATABASE_REPLICA_USER", result["USER"])
+    result["PASSWORD"] = os.getenv("DATABASE_REPLICA_PASSWORD", result["PASSWORD"])
+    if service_name:
+        result["HOST"] = os.getenv("{}_SERVICE_HOST".format(service_name))
+        result["PORT"] = os.getenv("{}_SERVICE_PORT".format(service_name))
+    # tests read and write a single database
+    result["TEST"] = {"MIRROR": "default"}
+    return result
+
+
+def warm_up():
+    """Open the connection to every database, so that the first request of a
+    worker doesn't pay for it. Called by conf/gunicorn.py once a worker boots"""
+    from django.db import connections
+
+    for connection in connections.all():
+        connection.ensure_connection()
@@ -0,0 +1,299 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Prometheus' default buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Registry:
+    """Holds the metrics of this process, and renders them in the Prometheus
+    text format.
+
+    With the METRICS_DIR setting, every process writes its metrics to a file
+    there, METRICS_FLUSH_INTERVAL seconds after they change at most, and
+    rendering adds up the files of every process. This is how the metrics of
+    all gunicorn workers, and of the auction scheduler, are served together.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, "Metric"] = {}
+        self.lock = threading.Lock()
+        # whether there are samples that weren't written to METRICS_DIR yet
+        self.dirty = False
+        # process whose thread writes them, a forked process starts its own
+        self.flusher_pid: Optional[int] = None
+
+    def register(self, metric: "Metric"):
+        self.metrics[metric.name] = metric
+
+    def reset(self):
+        """Forget the values of every metric, in a newly forked process"""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+            self.dirty = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the values of every metric, in a JSON-serializable dict"""
+        with self.lock:
+            return {
+                name: {
+                    **metric.describe(),
+                    # histogram counts are copied, as they change in place
+                    "samples": [
+                        [list(labels), list(v) if isinstance(v, list) else v]
+                        for labels, v in metric.values.items()
+                    ],
+                }
+                for name, metric in self.metrics.items()
+            }
+
+    def changed(self):
+        """Schedule the metrics of this process to be written to its file.
+
+        A background thread writes them every METRICS_FLUSH_INTERVAL seconds,
+        so that the last samples of an idle worker aren't held back until it
+        gets another request.
+        """
+        if not settings.METRICS_DIR:
+            return
+        self.dirty = True
+        if self.flusher_pid != os.getpid():
+            with self.lock:
+                if self.flusher_pid == os.getpid():
+                    return
+                self.flusher_pid = os.getpid()
+            threading.Thread(
+                target=self.flush_periodically, name="metrics-flush", daemon=True
+            ).start()
+
+    def flush_periodically(self):
+        """Write the metrics of this process whenever they changed, forever"""
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.dirty:
+                self.flush()
+
+    def flush(self):
+        """Write the metrics of this process to its file in METRICS_DIR"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        self.dirty = False
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        # replaced in one step, so that readers never see a partial file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self) -> Dict[str, Any]:
+        """Return the metrics of every process, or of this one only without
+        METRICS_DIR"""
+        snapshots = [self.snapshot()]
+        directory = settings.METRICS_DIR
+        if directory:
+            own = f"{os.getpid()}.json"
+            for filename in os.listdir(directory):
+                if not filename.endswith(".json") or filename == own:
+                    continue
+                try:
+                    with open(os.path.join(directory, filename)) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    # removed or replaced while it was read
+                    continue
+        return merge(snapshots)
+
+    def render(self) -> str:
+        """Return the metrics of every process in the Prometheus text format"""
+        lines = []
+        for name, metric in sorted(self.collect().items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in sorted(metric["samples"]):
+                if metric["type"] == "counter":
+                    sample = format_value(value)
+                    lines.append(f"{name}{format_labels(labels)} {sample}")
+                    continue
+                # histogram buckets are cumulative, up to +Inf
+                cumulative = 0
+                bounds = [f"{b:g}" for b in metric["buckets"]] + ["+Inf"]
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    bucket_labels = format_labels(labels + [("le", bound)])
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(
+                    f"{name}_sum{format_labels(labels)} {format_value(value[-1])}"
+                )
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def format_labels(labels: Sequence[Sequence[str]]) -> str:
+    """Return labels in the Prometheus text format, e.g. {view="api:show_item"}"""
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    """Return a sample value in the Prometheus text format, without rounding"""
+    return str(int(value)) if value == int(value) else repr(float(value))
+
+
+def merge(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up the samples of several snapshots"""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for labels, value in metric["samples"]:
+                key = tuple(tuple(label) for label in labels)
+                if key not in target["samples"]:
+                    target["samples"][key] = value
+                elif isinstance(value, list):
+                    current = target["samples"][key]
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] += value
+    for metric in merged.values():
+        metric["samples"] = [
+            [[list(label) for label in labels], value]
+            for labels, value in metric["samples"].items()
+        ]
+    return merged
+
+
+class Metric:
+    """A named metric, whose values are kept per set of labels"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry
+        self.values: Dict[Labels, Any] = {}
+        registry.register(self)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"type": self.type, "help": self.documentation}
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.changed()
+
+
+class Histogram(Metric):
+    """Counts observations, such as latencies, into buckets of upper bounds"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float],
+        registry: Registry = REGISTRY,
+    ):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(buckets)
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "buckets": self.buckets}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self.registry.lock:
+            # one count per bucket, not cumulative, then +Inf and the sum
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+        self.registry.changed()
+
+
+requests_total = Counter("http_requests_total", "HTTP requests by view and status")
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time spent on HTTP requests by view",
+    LATENCY_BUCKETS,
+)
+response_size = Histogram(
+    "http_response_size_bytes", "Size of HTTP response bodies by view", SIZE_BUCKETS
+)
+request_queries = Histogram(
+    "http_request_db_queries", "SQL queries run per HTTP request by view", QUERY_BUCKETS
+)
+
+
+def record_request(
+    view: str, method: str, status: int, duration: float, size: int, queries: int
+):
+    """Record the metrics of a finished request"""
+    requests_total.inc(view=view, method=method, status=str(status))
+    request_duration.observe(duration, view=view)
+    response_size.observe(size, view=view)
+    request_queries.observe(queries, view=view)
+
+
+# number of SQL queries run by the current request, in a one-item list so that
+# it can be incremented without setting the variable again
+query_count: ContextVar[Optional[List[int]]] = ContextVar("query_count", default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """Execute wrapper counting the queries of the current request, installed on
+    every database connection by metrics_middleware"""
+    count = query_count.get()
+    if count is not None:
+        count[0] += 1
+    return execute(sql, params, many, context)
+
+
+os.register_at_fork(after_in_child=REGISTRY.reset)
+atexit.register(REGISTRY.flush)
+
+
+def clear_directory(directory: Optional[str]):
+    """Remove the files of processes from a previous run, before the workers
+    start (see conf/gunicorn.py)"""
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for filename in os.listdir(directory):
+        if filename.endswith((".json", ".tmp")):
+            os.remove(os.path.join(directory, filename))
@@ -1,36 +1,401 @@
-from typing import Callable
+import json
+import logging
+import random
+import time
+import zlib
+from contextlib import ExitStack
+from typing import AsyncIterator, Callable, Iterator, Optional
+from django.conf import settings
+from django.core.exceptions import BadRequest, MiddlewareNotUsed, RequestDataTooBig
+from django.core.signals import request_finished
+from django.db import connections
+from django.core.files.uploadhandler import FileUploadHandler
 from django.http import HttpRequest, HttpResponse, QueryDict
 from django.http.multipartparser import MultiPartParser
 from django.utils.datastructures import MultiValueDict
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, profiling, routers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 GetResponseCallable = Callable[[HttpRequest], HttpResponse]
 
+logger = logging.getLogger(__name__)
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """Reject multipart bodies and uploaded files larger than MAX_UPLOAD_SIZE.
+
+    Must come first in FILE_UPLOAD_HANDLERS, so that chunks are checked before
+    the other handlers store them.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        if content_length > settings.MAX_UPLOAD_SIZE:
+            raise RequestDataTooBig("Request body exceeded MAX_UPLOAD_SIZE.")
+
+    def receive_data_chunk(self, raw_data, start):
+        # the size of the body isn't always known beforehand, check every file too
+        if start + len(raw_data) > settings.MAX_UPLOAD_SIZE:
+            raise RequestDataTooBig("Uploaded file exceeded MAX_UPLOAD_SIZE.")
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def parse_json(body: bytes) -> QueryDict:
+    """Parse a JSON object into a QueryDict, so forms can read it like form data"""
+    try:
+        params = json.loads(body or b"{}")
+    except ValueError as e:
+        raise BadRequest("Invalid JSON body") from e
+    if not isinstance(params, dict):
+        raise BadRequest("JSON body must be an object")
+    return json_to_query_dict(params)
+
+
+def json_to_query_dict(params: dict) -> QueryDict:
+    """Convert a decoded JSON object into an immutable QueryDict"""
+    data = QueryDict(mutable=True)
+    for key, value in params.items():
+        values = value if isinstance(value, list) else [value]
+        data.setlist(key, [str(v) for v in values if v is not None])
+    data._mutable = False
+    return data
+
+
+def parse_request(request: HttpRequest) -> tuple[QueryDict, MultiValueDict]:
+    """Parse the body of a request, uploaded files are streamed through the
+    upload handlers"""
+    if request.content_type.startswith("multipart"):
+        parser = MultiPartParser(
+            request.META,
+            request,
+            request.upload_handlers,
+        )
+        return parser.parse()
+    elif request.content_type == "application/json":
+        return parse_json(request.body), MultiValueDict()
+    else:
+        return QueryDict(request.body), MultiValueDict()
+
 
 def rest_middleware(get_response: GetResponseCallable):
-    """This creates request.PUT and request.DELETE"""
-
-    def parse_request(request: HttpRequest) -> tuple[QueryDict, MultiValueDict]:
-        if request.content_type.startswith("multipart"):
-            parser = MultiPartParser(
-                request.META,
-                request,
-                request.upload_handlers,
-            )
-            return parser.parse()
-        else:
-            return QueryDict(request.body), MultiValueDict()
+    """This creates request.PUT and request.DELETE.
+
+    The body is only parsed once request.PUT, request.DELETE or request.FILES is
+    first used, so requests rejected before that never read it.
+    """
+
+    def load_body(request: HttpRequest) -> QueryDict:
+        if not hasattr(request, "_files"):
+            request._post = QueryDict()
+            try:
+                request._rest_data, request._files = parse_request(request)
+            except Exception:
+                # like Django does for POST, so error pages can still show the
+                # request without parsing the body again
+                request._rest_data, request._files = QueryDict(), MultiValueDict()
+                raise
+        return request._rest_data
 
     def middleware(request: HttpRequest):
         # Populate PUT and DELETE with empty dicts for now
         request.PUT = QueryDict("")
         request.DELETE = QueryDict("")
 
-        # Parse request and load data
-        if request.method == "PUT":
-            request.PUT, request._files = parse_request(request)
-        elif request.method == "DELETE":
-            request.DELETE, request._files = parse_request(request)
+        # Load data when it is first used
+        if request.method in ("PUT", "DELETE"):
+            setattr(
+                request, request.method, SimpleLazyObject(lambda: load_body(request))
+            )
+            # request.FILES calls this to load files that weren't loaded yet
+            request._load_post_and_files = lambda: load_body(request)
 
         return get_response(request)
 
     return middleware
+
+
+class Compressor:
+    """Incrementally compress a response body with gzip or brotli"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(
+                quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        else:
+            # wbits 31 writes a gzip header and trailer around the deflate stream
+            self._compressor = zlib.compressobj(
+                settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk, and return everything that can be sent so far"""
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self) -> bytes:
+        """Return the end of the compressed stream"""
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def accepted_encoding(request: HttpRequest) -> Optional[str]:
+    """Return the best encoding accepted by the client, br or gzip, if any"""
+    accepted = {}
+    for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [e for e in available if accepted.get(e, accepted.get("*", 0)) > 0]
+    if not candidates:
+        return None
+    # prefer the encoding with the highest quality, then brotli over gzip
+    return max(candidates, key=lambda e: accepted.get(e, accepted.get("*", 0)))
+
+
+def is_compressible(response: HttpResponse) -> bool:
+    """Return whether a response should be compressed"""
+    if response.has_header("Content-Encoding"):
+        return False
+    content_type = response.get("Content-Type", "").split(";")[0].strip()
+    if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+        return False
+    if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+        return False
+    return True
+
+
+def compress_stream(chunks: Iterator[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk, each chunk is sent as it comes"""
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(
+    chunks: AsyncIterator[bytes], encoding: str
+) -> AsyncIterator[bytes]:
+    """Like compress_stream, for responses of async views"""
+    compressor = Compressor(encoding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compression_middleware(get_response: GetResponseCallable):
+    """This compresses responses with gzip or brotli, as negotiated with the client.
+
+    Bodies smaller than COMPRESSION_MIN_SIZE aren't worth compressing, and only
+    the content types in COMPRESSION_CONTENT_TYPES are compressed. Streamed
+    responses are compressed chunk by chunk.
+    """
+
+    def middleware(request: HttpRequest):
+        response = get_response(request)
+        if not is_compressible(response):
+            return response
+
+        # caches must keep the compressed and uncompressed responses apart
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    response.streaming_content, encoding
+                )
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, encoding
+                )
+            # the length of the compressed body isn't known in advance
+            del response.headers["Content-Length"]
+        else:
+            compressor = Compressor(encoding)
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # the body isn't byte for byte the same anymore
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    return middleware
+
+
+# cookie pinning the requests of a client to the primary database after a write
+PRIMARY_COOKIE = "db_primary"
+
+
+def replica_middleware(get_response: GetResponseCallable):
+    """This lets GET and HEAD requests read from the replica database.
+
+    Clients are pinned to the primary for REPLICA_STICKY_SECONDS after a
+    request that wrote to the database, so that they see their own writes even
+    if the replica lags behind. Requests that only read, such as most batches,
+    don't pin them. Not used unless a replica is configured.
+    """
+    if routers.REPLICA not in settings.DATABASES:
+        raise MiddlewareNotUsed()
+    # reads of streamed responses happen after the middleware returns, so the
+    # request is only pinned back once the response is closed
+    request_finished.connect(routers.pin_to_primary)
+
+    def middleware(request: HttpRequest):
+        safe = request.method in ("GET", "HEAD")
+        routers.use_replica.set(safe and PRIMARY_COOKIE not in request.COOKIES)
+        routers.wrote.set(False)
+
+        response = get_response(request)
+        if routers.wrote.get():
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    return middleware
+
+
+def profiling_middleware(get_response: GetResponseCallable):
+    """This profiles a sample of requests, a PROFILING_SAMPLE_RATE fraction of
+    them, and reports their timings in a Server-Timing header.
+
+    Query shapes run PROFILING_REPEATED_QUERIES times or more in one request,
+    usually one query per object of a list, are logged as warnings with the
+    view that ran them. Queries run while a streamed response is sent aren't
+    profiled. Not used if the sample rate is 0.
+    """
+    if settings.PROFILING_SAMPLE_RATE <= 0:
+        raise MiddlewareNotUsed()
+
+    def middleware(request: HttpRequest):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return get_response(request)
+
+        profile = profiling.RequestProfile()
+        token = profiling.current.set(profile)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = get_response(request)
+        finally:
+            profiling.current.reset(token)
+        total = time.perf_counter() - start
+
+        response.headers["Server-Timing"] = profile.server_timing(total)
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        for sql, count in profile.repeated(settings.PROFILING_REPEATED_QUERIES):
+            logger.warning("Query run %d times by %s: %s", count, view, sql)
+        return response
+
+    return middleware
+
+
+def measure_stream(chunks: Iterator[bytes], finish: Callable[[int], None]):
+    """Pass a streamed body through, and call finish with its size once sent"""
+    size = 0
+    try:
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        finish(size)
+
+
+async def ameasure_stream(
+    chunks: AsyncIterator[bytes], finish: Callable[[int], None]
+) -> AsyncIterator[bytes]:
+    """Like measure_stream, for responses of async views"""
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    finally:
+        finish(size)
+
+
+def metrics_middleware(get_response: GetResponseCallable):
+    """This records the count, latency, response size and SQL queries of every
+    request in project.metrics, by URL name.
+
+    Streamed responses are recorded once their last chunk is sent, with the
+    queries run while streaming.
+    """
+
+    def middleware(request: HttpRequest):
+        for connection in connections.all():
+            if metrics.count_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(metrics.count_query)
+        queries = [0]
+        metrics.query_count.set(queries)
+        start = time.perf_counter()
+
+        response = get_response(request)
+
+        def finish(size: int):
+            match = request.resolver_match
+            metrics.record_request(
+                view=match.view_name if match else "unmatched",
+                method=request.method,
+                status=response.status_code,
+                duration=time.perf_counter() - start,
+                size=size,
+                queries=queries[0],
+            )
+
+        if not response.streaming:
+            finish(len(response.content))
+        elif response.is_async:
+            response.streaming_content = ameasure_stream(
+                response.streaming_content, finish
+            )
+        else:
+            response.streaming_content = measure_stream(
+                response.streaming_content, finish
+            )
+        return response
+
+    return middleware
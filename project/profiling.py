@@ -0,0 +1,64 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# the profile of the current request, when it is sampled
+current: ContextVar[Optional["RequestProfile"]] = ContextVar("profile", default=None)
+
+
+class RequestProfile:
+    """Counts and times the SQL statements of a request, and other named spans.
+
+    Installed on database connections as an execute wrapper. Statements are
+    grouped by their SQL before parameters are filled in, so the same query
+    run for each object of a list shows up as one repeated shape.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes: Counter = Counter()
+        self.spans: Dict[str, float] = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Return the query shapes run at least threshold times, most run first"""
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+    def server_timing(self, total: float) -> str:
+        """Return the Server-Timing header of the request, given its total
+        duration in seconds"""
+        metrics = [
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f"app;dur={total * 1000:.2f}",
+        ]
+        metrics += [
+            f"{name};dur={duration * 1000:.2f}" for name, duration in self.spans.items()
+        ]
+        return ", ".join(metrics)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Add the duration of the body to a named span of the current profile,
+    reported in its Server-Timing header. Does nothing on unsampled requests"""
+    profile = current.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.spans[name] += time.perf_counter() - start
@@ -0,0 +1,45 @@
+from contextvars import ContextVar
+
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+# whether reads of the current request may go to the replica, only ever set
+# by replica_middleware so that commands and workers always read the primary
+use_replica: ContextVar[bool] = ContextVar("use_replica", default=False)
+# whether the current request has written to the database, reset by
+# replica_middleware which then pins the client to the primary
+wrote: ContextVar[bool] = ContextVar("wrote", default=False)
+
+
+def pin_to_primary(**kwargs):
+    """Send every read to the primary until the next request allows otherwise"""
+    use_replica.set(False)
+
+
+class ReplicaRouter:
+    """Send reads to the read replica, and writes to the primary.
+
+    Reads go to the primary once the current request has written anything, and
+    inside transactions, so that requests see their own writes. Requests
+    shortly after a write are pinned to the primary by replica_middleware.
+    """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and not connections[PRIMARY].in_atomic_block:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema from the primary
+        return db == PRIMARY
@@ -52,7 +52,11 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "project.middleware.metrics_middleware",
+    "project.middleware.profiling_middleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    # after WhiteNoise, which serves static files with its own compression
+    "project.middleware.compression_middleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -60,6 +64,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "project.middleware.rest_middleware",
+    "project.middleware.replica_middleware",
 ]
 
 ROOT_URLCONF = "project.urls"
@@ -90,6 +95,84 @@ from . import database
 
 DATABASES = {"default": database.config()}
 
+# Set DATABASE_REPLICA_SERVICE_NAME or DATABASE_REPLICA_NAME to send the reads
+# of GET requests to a read replica (see project.routers.ReplicaRouter)
+replica = database.replica_config()
+if replica:
+    DATABASES["replica"] = replica
+    DATABASE_ROUTERS = ["project.routers.ReplicaRouter"]
+
+# Clients read from the primary for this many seconds after writing, so they
+# don't see stale data while the replica catches up
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "10"))
+
+
+# Profiling
+# Fraction of requests whose SQL queries are counted and timed, 0 to 1, and
+# how many runs of the same query in a request are logged as an N+1 pattern
+# (see project.middleware.profiling_middleware)
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_REPEATED_QUERIES = int(os.getenv("PROFILING_REPEATED_QUERIES", "5"))
+
+
+# Metrics
+# Served at /metrics in the Prometheus text format. Set METRICS_DIR to a
+# directory shared by every gunicorn worker to serve the metrics of all of
+# them, each writing its own within METRICS_FLUSH_INTERVAL seconds of a change
+# (see project.metrics.Registry)
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+
+# Cache
+# Per-process memory by default, set CACHE_BACKEND and CACHE_LOCATION to share
+# it between processes, e.g. django.core.cache.backends.redis.RedisCache
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+# Cache of the dictionaries items, queries and users are serialized to
+# (see api.serialization.SerializationCache)
+SERIALIZATION_CACHE = {
+    # entries kept in the memory of each process
+    "max_size": int(os.getenv("SERIALIZATION_CACHE_SIZE", "10000")),
+    # seconds before entries are rebuilt, even if nothing invalidated them. Only
+    # a shared backend sees objects saved by other processes, hence a few without
+    "timeout": float(
+        os.getenv(
+            "SERIALIZATION_CACHE_TIMEOUT",
+            "300" if os.getenv("SERIALIZATION_CACHE_BACKEND") else "5",
+        )
+    ),
+    # name of a cache in CACHES shared by every process, if any
+    "backend": os.getenv("SERIALIZATION_CACHE_BACKEND") or None,
+}
+
+# Whether the default cache is shared by every process, so that deleting an
+# entry in one worker deletes it for all of them
+SHARED_CACHE = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+# Sessions are read from the cache and written through to the database, if
+# logging out in one worker also drops them from the cache of the others
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db"
+    if SHARED_CACHE
+    else "django.contrib.sessions.backends.db"
+)
+
+# Users of requests are cached for this many seconds, only with a shared cache
+# by default (see userauth.backends.CachedModelBackend)
+AUTHENTICATION_BACKENDS = ["userauth.backends.CachedModelBackend"]
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "5" if SHARED_CACHE else "0"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -172,3 +255,36 @@ PRINT_EMAILS = os.getenv("PRINT_EMAILS", "False").lower().strip() not in ("false
 PRINT_PERMITTED_EMAILS_REGEX = [
     r"^.+@gmail\.com$",
 ]
+
+# Live item events (see api.events)
+# Class fanning out events to subscribers, replace it to fan out across processes
+EVENT_BROADCASTER = os.getenv("EVENT_BROADCASTER", "api.events.LocalBroadcaster")
+# Seconds between keepalive comments sent on idle event streams
+EVENT_STREAM_KEEPALIVE = float(os.getenv("EVENT_STREAM_KEEPALIVE", "15"))
+# Seconds after which an event stream is closed, clients then reconnect
+EVENT_STREAM_MAX_AGE = float(os.getenv("EVENT_STREAM_MAX_AGE", "300"))
+
+# Uploads
+# Largest request body or uploaded file accepted, in bytes
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(10 * 1024 * 1024)))
+# Files larger than FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to temporary files
+FILE_UPLOAD_HANDLERS = [
+    "project.middleware.UploadSizeLimitHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# Function encoding API responses to JSON (see api.encoders)
+API_JSON_ENCODER = os.getenv("API_JSON_ENCODER", "api.encoders.encode_fastest")
+
+# Response compression (see project.middleware.compression_middleware)
+# Smallest response body compressed, in bytes, smaller ones don't shrink much
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# gzip level from 1 (fastest) to 9 (smallest)
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# brotli quality from 0 (fastest) to 11 (smallest), used when brotli is installed
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Content types compressed, only API responses: compressing HTML pages that
+# reflect input next to a CSRF token would expose it to BREACH. Static files
+# are compressed by WhiteNoise
+COMPRESSION_CONTENT_TYPES = ["application/json"]
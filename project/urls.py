@@ -27,5 +27,6 @@ urlpatterns = [
     path("", include("userauth.urls", namespace="userauth")),
     path("api/", include("api.urls", namespace="api")),
     path("health/", views.health),
+    path("metrics/", views.metrics),
     path("admin/", admin.site.urls),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
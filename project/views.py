@@ -1,6 +1,15 @@
 from django.http import HttpResponse, HttpRequest
+from django.views.decorators.http import require_http_methods
+
+from .metrics import REGISTRY
 
 
 def health(request: HttpRequest) -> HttpResponse:
     """/health endpoint for deploying in OpenShift"""
     return HttpResponse()
+
+
+@require_http_methods(["GET"])
+def metrics(request: HttpRequest) -> HttpResponse:
+    """/metrics endpoint for Prometheus, with the metrics of every worker"""
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4")
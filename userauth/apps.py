@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 
 
 class UserAuthConfig(AppConfig):
@@ -6,3 +8,16 @@ class UserAuthConfig(AppConfig):
 
     default_auto_field = "django.db.models.BigAutoField"
     name = "userauth"
+
+    def ready(self):
+        from .backends import CachedModelBackend
+        from .models import User
+
+        # keep cached users in sync with the database, once other processes
+        # can no longer read the previous version
+        def invalidate_user(sender, instance: User, **kwargs):
+            pk = instance.pk
+            transaction.on_commit(lambda: CachedModelBackend.invalidate(pk))
+
+        post_save.connect(invalidate_user, sender=User, weak=False)
+        post_delete.connect(invalidate_user, sender=User, weak=False)
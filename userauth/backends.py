@@ -0,0 +1,42 @@
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+from .models import User
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend keeping recently authenticated users in the default cache.
+
+    AuthenticationMiddleware loads the user of every request through get_user,
+    which is then served from the cache for USER_CACHE_TTL seconds instead of
+    querying the database. Entries are dropped when a user is saved or deleted
+    (see UserAuthConfig.ready), so USER_CACHE_TTL is 0 unless the cache is
+    shared by every process: deactivating a user or changing their password
+    must log them out of every worker, not only the one that saved them.
+    """
+
+    def get_user(self, user_id) -> Optional[User]:
+        if not settings.USER_CACHE_TTL:
+            return super().get_user(user_id)
+
+        # values are pickled, so changes made by a request don't leak into it
+        user = cache.get(self.cache_key(user_id))
+        if user is not None:
+            return user
+
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(self.cache_key(user_id), user, settings.USER_CACHE_TTL)
+        return user
+
+    @staticmethod
+    def cache_key(user_id) -> str:
+        return f"userauth:user:{user_id}"
+
+    @classmethod
+    def invalidate(cls, user_id):
+        """Drop a user from the cache"""
+        cache.delete(cls.cache_key(user_id))
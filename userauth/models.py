@@ -47,6 +47,8 @@ class User(AbstractUser):
     email = models.EmailField(unique=True)
     dob = models.DateField(null=False)
     avatar = models.ImageField(blank=True)
+    # changes the ETags of responses showing this user (see api.etags)
+    updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["dob"]
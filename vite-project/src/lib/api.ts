@@ -32,6 +32,13 @@ export interface ServerResponse {
   status: 'OK' | 'FAILED';
   message?: string;
   value?: any;
+  // cursor of the next page for paginated endpoints, null on the last page
+  next_cursor?: string | null;
+}
+
+export interface Page<T> {
+  value: T[];
+  nextCursor: string | null;
 }
 
 export async function get(endpoint: string, query?: Record<string, string>): Promise<any> {
@@ -40,12 +47,25 @@ export async function get(endpoint: string, query?: Record<string, string>): Pro
     const params = new URLSearchParams(query);
     endpoint = `${endpoint}?${params.toString()}`;
   }
-  const res = await fetch(`${HOST}/api${endpoint}`, { credentials: "include" });
+  // revalidated with the ETag of the cached response, answered with 304 if unchanged
+  const res = await fetch(`${HOST}/api${endpoint}`, { credentials: "include", cache: "no-cache" });
   const json: ServerResponse = await res.json();
   if (json.status !== 'OK') throw json.message;
   return json.value;
 }
 
+export async function getPage(endpoint: string, query?: Record<string, string>): Promise<Page<any>> {
+  if (!endpoint.endsWith('/')) endpoint += '/';
+  if (query) {
+    const params = new URLSearchParams(query);
+    endpoint = `${endpoint}?${params.toString()}`;
+  }
+  const res = await fetch(`${HOST}/api${endpoint}`, { credentials: "include" });
+  const json: ServerResponse = await res.json();
+  if (json.status !== 'OK') throw json.message;
+  return { value: json.value, nextCursor: json.next_cursor ?? null };
+}
+
 export async function post(endpoint: string, body: XMLData): Promise<any> {
   if (!endpoint.endsWith('/')) endpoint += '/';
   const res = await fetch(`${HOST}/api${endpoint}`, {
@@ -60,9 +80,37 @@ export async function post(endpoint: string, body: XMLData): Promise<any> {
 
 export async function put(endpoint: string, body: XMLData): Promise<any> {
   if (!endpoint.endsWith('/')) endpoint += '/';
+  // files need multipart encoding, everything else is sent as lighter JSON
+  const hasFiles = Object.values(body).some((value) => value instanceof File);
   const res = await fetch(`${HOST}/api${endpoint}`, {
     method: 'PUT',
-    body: objectToFormData(body),
+    body: hasFiles ? objectToFormData(body) : JSON.stringify(body),
+    headers: hasFiles ? undefined : { 'Content-Type': 'application/json' },
+    credentials: "include",
+  });
+  const json: ServerResponse = await res.json();
+  if (json.status !== 'OK') throw json.message;
+  return json.value;
+}
+
+export interface BatchRequest {
+  method?: 'GET' | 'POST' | 'PUT' | 'DELETE';
+  // path relative to /api, with an optional query string
+  path: string;
+  body?: Record<string, number | string>;
+}
+
+export interface BatchResult {
+  status: number;
+  body: ServerResponse;
+}
+
+/** Make several API requests in a single round trip, and return their results in order */
+export async function batch(requests: BatchRequest[]): Promise<BatchResult[]> {
+  const res = await fetch(`${HOST}/api/batch/`, {
+    method: 'POST',
+    body: JSON.stringify({ requests }),
+    headers: { 'Content-Type': 'application/json' },
     credentials: "include",
   });
   const json: ServerResponse = await res.json();
@@ -70,6 +118,15 @@ export async function put(endpoint: string, body: XMLData): Promise<any> {
   return json.value;
 }
 
+/** Get several endpoints in a single round trip, and return their values in order */
+export async function getMany(endpoints: string[]): Promise<any[]> {
+  const results = await batch(endpoints.map((path) => ({ path })));
+  return results.map(({ body }) => {
+    if (body.status !== 'OK') throw body.message;
+    return body.value;
+  });
+}
+
 export interface Item {
   id: number;
   owner: User;
@@ -90,13 +147,32 @@ export interface Item {
   has_ended: boolean;
 }
 
-/** Get a list of all items */
-export async function getItems(query?: string): Promise<Item[]> {
-  if (query) {
-    return await get('/items', { q: query });
-  } else {
-    return await get('/items');
-  }
+/** Get a page of items, optionally filtered by a search query.
+ * Pass the `nextCursor` of the previous page to get the page after it. */
+export async function getItems(query?: string, cursor?: string | null): Promise<Page<Item>> {
+  const params: Record<string, string> = {};
+  if (query) params.q = query;
+  if (cursor) params.cursor = cursor;
+  return await getPage('/items', params);
+}
+
+export interface Changes {
+  items: Item[];
+  queries: (ItemQuery & { item_id: number })[];
+  // cursor to pass as `since` on the next poll
+  cursor: string;
+  // whether more changes are waiting to be fetched
+  hasMore: boolean;
+}
+
+/** Get the items and queries changed since a cursor, or everything without one */
+export async function getChanges(since?: string): Promise<Changes> {
+  const res = await fetch(`${HOST}/api/items/changes/${since ? `?since=${encodeURIComponent(since)}` : ''}`, {
+    credentials: "include",
+  });
+  const json = await res.json();
+  if (json.status !== 'OK') throw json.message;
+  return { ...json.value, cursor: json.next_cursor, hasMore: json.has_more };
 }
 
 /** Get a single item by ID */
@@ -134,6 +210,40 @@ export async function bidItem(itemId: number, bid: ItemBidParams): Promise<Item>
   return await put(`/items/${itemId}/bid`, bid);
 }
 
+export interface Bid {
+  id: number;
+  user: User;
+  // NOTE: returned as a string, like prices of items
+  amount: string;
+  created_at: string;
+}
+
+/** Get a page of the bids placed on an item, highest first */
+export async function getItemBids(itemId: number, cursor?: string | null): Promise<Page<Bid>> {
+  return await getPage(`/items/${itemId}/bids`, cursor ? { cursor } : undefined);
+}
+
+export interface ItemEventHandlers {
+  // called with the updated item when someone bids on it
+  bid?: (item: Item) => void;
+  // called with the updated query when the owner answers it
+  answer?: (query: ItemQuery) => void;
+}
+
+/** Listen to live events about an item. Call `close()` on the result to stop.
+ * `onUnavailable` is called if the server doesn't stream events, e.g. when it isn't
+ * served through ASGI, as the browser then gives up instead of reconnecting */
+export function subscribeItemEvents(itemId: number, handlers: ItemEventHandlers, onUnavailable?: () => void): EventSource {
+  const events = new EventSource(`${HOST}/api/items/${itemId}/events/`, { withCredentials: true });
+  for (const [name, handler] of Object.entries(handlers)) {
+    events.addEventListener(name, (e) => handler(JSON.parse((e as MessageEvent).data)));
+  }
+  events.addEventListener('error', () => {
+    if (events.readyState === EventSource.CLOSED) onUnavailable?.();
+  });
+  return events;
+}
+
 export interface ItemQuery {
   id: number;
   question: string;